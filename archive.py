@@ -0,0 +1,75 @@
+from datetime import date, timedelta
+from sqlalchemy import select, insert, delete
+from models import Loan, LoanArchive
+from database import _record_changes, CHANGE_FIELDS
+from instrumentation import instrumented
+
+# Loan archival: returned loans older than a horizon move from `loans` to `loans_archive`,
+# in batches of one short transaction each, so the hot table (overdue, availability and
+# booking checks, loan listings) only holds open and recent loans. Open loans and
+# reservations are never archived. Each moved loan leaves an 'archived' change event, so feed
+# consumers drop it from their view of `loans`.
+ARCHIVE_AFTER_DAYS = 365   # Default horizon: loans returned more than a year ago
+ARCHIVE_BATCH = 1000       # Loans moved per transaction
+
+ARCHIVED_COLUMNS = ['id', 'borrower_id', 'tool_id', 'loan_date', 'due_date', 'return_date', 'condition_note']
+
+class ArchiveReport:
+    """Outcome of one archive_loans call."""
+
+    def __init__(self, cutoff):
+        self.cutoff = cutoff  # Loans returned before this date were eligible
+        self.batches = 0
+        self.moved = 0
+        self.done = False     # False when max_batches stopped the run early
+
+    def __repr__(self):
+        return f"<ArchiveReport before {self.cutoff}: {self.moved} loans in {self.batches} batches>"
+
+def partition_name(year):
+    return f"loans_archive_y{year}"
+
+def _ensure_partitions(session, years):
+    # Postgres only: a row whose loan_date has no partition can't be inserted
+    for year in sorted(years):
+        session.connection().exec_driver_sql(
+            f"CREATE TABLE IF NOT EXISTS {partition_name(year)} PARTITION OF loans_archive "
+            f"FOR VALUES FROM ('{year}-01-01') TO ('{year + 1}-01-01')")
+
+# JOB
+@instrumented
+def archive_loans(session, older_than_days=ARCHIVE_AFTER_DAYS, batch_size=ARCHIVE_BATCH, max_batches=None, today=None):
+    """Move loans returned more than older_than_days ago into loans_archive; returns an ArchiveReport.
+
+    Each batch (oldest ids first) is copied and deleted in one transaction, so an
+    interrupted run loses nothing and a rerun carries on where it stopped.
+    """
+    if older_than_days < 0:
+        raise ValueError("Horizon can't be negative")
+    report = ArchiveReport((today or date.today()) - timedelta(days=older_than_days))
+    postgres = session.get_bind().dialect.name == 'postgresql'
+    stmt = select(Loan.id, Loan.loan_date).where(
+        Loan.return_date < report.cutoff, Loan.is_reservation.is_(False)
+    ).order_by(Loan.id).limit(batch_size)
+    if postgres:
+        stmt = stmt.with_for_update(skip_locked=True)  # Two archivers never take the same rows
+    while max_batches is None or report.batches < max_batches:
+        rows = session.execute(stmt).all()
+        if not rows:
+            report.done = True
+            break
+        ids = [row.id for row in rows]
+        if postgres:
+            _ensure_partitions(session, {row.loan_date.year for row in rows})
+        session.execute(insert(LoanArchive).from_select(
+            ARCHIVED_COLUMNS, select(*(Loan.__table__.c[name] for name in ARCHIVED_COLUMNS)).where(Loan.id.in_(ids))))
+        archived = session.execute(delete(Loan).where(Loan.id.in_(ids)).returning(
+            *(Loan.__table__.c[name] for name in CHANGE_FIELDS['loan'])), execution_options={'synchronize_session': False}).all()
+        _record_changes(session, 'loan', 'archived', archived)
+        session.commit()
+        report.batches += 1
+        report.moved += len(ids)
+        if len(rows) < batch_size:
+            report.done = True
+            break
+    return report
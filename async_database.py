@@ -0,0 +1,214 @@
+import os
+from sqlalchemy import select, insert, update
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from models import Base, Neighbor, Tool, Loan, ChangeEvent
+from db_connect import DB_URL, pool_settings, engine_kwargs, enable_sqlite_foreign_keys
+from database import (PAGE_SIZE, _loader_options, _is_open_loan_conflict, _is_booking_conflict, _booking_insert,
+                      _loans_with_names, _invalidate_neighbor, _invalidate_tools, _change_events)
+from datetime import date
+
+# Async counterpart of database.py: same models, validation and error messages,
+# for serving many concurrent clients from one event loop. Async drivers can't share
+# the sync engine's pool, so this keeps its own, sized by the same DB_* settings.
+# Relationships can't lazy-load under asyncio, so reads default to loader='raise';
+# pass loader='selectin' (or 'joined') to get relationships loaded up front.
+ASYNC_DEFAULT_LOADER = 'raise'
+
+# Async drivers for the backends db_connect supports
+ASYNC_DRIVERS = {'postgresql': 'asyncpg', 'sqlite': 'aiosqlite'}
+
+def async_url(url=DB_URL):
+    """ASYNC_DATABASE_URL, or DATABASE_URL switched to its async driver."""
+    if os.environ.get('ASYNC_DATABASE_URL'):
+        return os.environ['ASYNC_DATABASE_URL']
+    url = make_url(url)
+    return url.set(drivername=f"{url.get_backend_name()}+{ASYNC_DRIVERS[url.get_backend_name()]}")
+
+def make_async_engine(url=None, **settings):
+    """Create an AsyncEngine (asyncpg or aiosqlite) with the same DB_* pool settings as the sync engine."""
+    url = url or async_url()
+    options = {**pool_settings(), **settings}
+    engine = create_async_engine(url, **engine_kwargs(url, **options))
+    if engine.dialect.name == 'sqlite':
+        enable_sqlite_foreign_keys(engine.sync_engine)
+    return engine
+
+_engine = None
+_sessionmaker = None
+
+def get_async_engine():
+    """The shared AsyncEngine, created on first use."""
+    global _engine, _sessionmaker
+    if _engine is None:
+        _engine = make_async_engine()
+        _sessionmaker = async_sessionmaker(_engine, autoflush=False, expire_on_commit=False)
+    return _engine
+
+def get_async_session():
+    """Returns a new AsyncSession (use with `async with`)."""
+    get_async_engine()
+    return _sessionmaker()
+
+async def create_tables(engine=None):
+    """Create the models.Base tables through an async engine."""
+    async with (engine or get_async_engine()).begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+def _options(loader, *relationships):
+    return _loader_options(loader or ASYNC_DEFAULT_LOADER, *relationships)
+
+async def _record_changes(session, entity, action, items):
+    # Same change feed events as database._record_changes, in the caller's transaction
+    events = _change_events(entity, action, items)
+    if events:
+        await session.execute(insert(ChangeEvent), events)
+
+# CREATE
+async def create_neighbor(session, name, address, email):
+    """Create a new neighbor."""
+    try:
+        if not email or '@' not in email:
+            raise ValueError("Invalid email format")
+        neighbor = Neighbor(name=name, address=address, email=email, latitude=None, longitude=None)
+        session.add(neighbor)
+        await session.flush()  # Assigns the id for the change event
+        await _record_changes(session, 'neighbor', 'created', [neighbor])
+        await session.commit()
+        await session.refresh(neighbor)
+        _invalidate_neighbor(neighbor.id)
+        return neighbor
+    except IntegrityError:
+        await session.rollback()
+        raise ValueError("Email already exists")
+    except ValueError as e:
+        await session.rollback()
+        raise e
+
+async def create_tool(session, name, description, owner_id):
+    """Create a new tool for an owner."""
+    try:
+        if not owner_id:
+            raise ValueError("Owner ID required")
+        tool = Tool(name=name, description=description, owner_id=owner_id)
+        session.add(tool)
+        await session.flush()
+        await _record_changes(session, 'tool', 'created', [tool])
+        await session.commit()
+        await session.refresh(tool)
+        _invalidate_tools()
+        return tool
+    except IntegrityError:
+        await session.rollback()
+        raise ValueError("Invalid owner ID")
+    except ValueError as e:
+        await session.rollback()
+        raise e
+
+async def create_loan(session, borrower_id, tool_id, loan_date, due_date):
+    """Create a new loan with availability check (single INSERT, see database.create_loan)."""
+    try:
+        if due_date <= loan_date:
+            raise ValueError("Due date must be after loan date")
+        loan = (await session.scalars(_booking_insert(borrower_id, tool_id, loan_date, due_date, False))).one_or_none()
+        if loan is None:
+            raise ValueError("Tool is reserved for those dates")
+        await session.execute(update(Tool).where(Tool.id == tool_id).values(current_loan_id=loan.id))
+        await _record_changes(session, 'loan', 'created', [loan])
+        await session.commit()
+        _invalidate_tools()
+        return loan
+    except IntegrityError as e:
+        await session.rollback()
+        if _is_open_loan_conflict(e):
+            raise ValueError("Tool is currently loaned out—cannot borrow again until returned.")
+        if _is_booking_conflict(e):
+            raise ValueError("Tool is reserved for those dates")
+        raise ValueError("Invalid borrower or tool ID")
+    except ValueError as e:
+        await session.rollback()
+        raise e
+
+# READ
+async def get_neighbor(session, neighbor_id, loader=None):
+    """Get neighbor by ID."""
+    stmt = select(Neighbor).options(*_options(loader, Neighbor.tools, Neighbor.loans_as_borrower)).where(Neighbor.id == neighbor_id)
+    return (await session.scalars(stmt)).first()
+
+async def get_all_neighbors(session, loader=None):
+    """Get all neighbors."""
+    stmt = select(Neighbor).options(*_options(loader, Neighbor.tools, Neighbor.loans_as_borrower))
+    return (await session.scalars(stmt)).unique().all()
+
+async def get_all_tools(session, loader=None):
+    """Get all tools."""
+    stmt = select(Tool).options(*_options(loader, Tool.owner))
+    return (await session.scalars(stmt)).all()
+
+async def get_neighbor_tools(session, neighbor_id, loader=None):
+    """Get neighbor's tools with JOIN."""
+    stmt = select(Tool).options(*_options(loader, Tool.owner)).join(Neighbor).where(Neighbor.id == neighbor_id)
+    return (await session.scalars(stmt)).all()
+
+async def get_overdue_loans(session, loader=None):
+    """Get overdue loans with borrower/tool JOIN."""
+    stmt = select(Loan).options(*_options(loader, Loan.borrower, Loan.tool)).join(Tool).join(Neighbor).where(
+        Loan.due_date < date.today(), Loan.return_date.is_(None), Loan.is_reservation.is_(False)
+    )
+    return (await session.scalars(stmt)).all()
+
+async def get_all_loans(session):
+    """Get all loans with borrower and tool names via explicit JOIN."""
+    return (await session.execute(_loans_with_names())).all()
+
+async def get_loans_page(session, before_id=None, limit=PAGE_SIZE):
+    """Get up to `limit` loans with id < before_id, newest first."""
+    stmt = _loans_with_names()
+    if before_id is not None:
+        stmt = stmt.where(Loan.id < before_id)
+    return (await session.execute(stmt.limit(limit))).all()
+
+async def _mark_tool_returned(session, loan):
+    await session.execute(
+        update(Tool).where(Tool.id == loan.tool_id, Tool.current_loan_id == loan.id).values(current_loan_id=None)
+    )
+
+# UPDATE
+async def update_loan_return(session, loan_id, return_date, condition_note):
+    """Update loan return."""
+    loan = await session.get(Loan, loan_id)
+    if loan:
+        if loan.is_reservation:
+            raise ValueError("Reservation hasn't been picked up—cancel it instead")
+        try:
+            if loan.return_date is None and return_date is not None:
+                await _mark_tool_returned(session, loan)
+            loan.return_date = return_date
+            loan.condition_note = condition_note
+            await _record_changes(session, 'loan', 'returned' if return_date is not None else 'updated', [loan])
+            await session.commit()
+        except BaseException:
+            await session.rollback()
+            raise
+        _invalidate_tools()
+        return loan
+    return None
+
+# DELETE
+async def delete_loan(session, loan_id):
+    """Delete a loan."""
+    loan = await session.get(Loan, loan_id)
+    if loan:
+        try:
+            if loan.return_date is None:
+                await _mark_tool_returned(session, loan)
+            await _record_changes(session, 'loan', 'deleted', [loan])
+            await session.delete(loan)
+            await session.commit()
+        except BaseException:
+            await session.rollback()
+            raise
+        _invalidate_tools()
+        return True
+    return False
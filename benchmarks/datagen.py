@@ -0,0 +1,101 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import random
+from datetime import date, timedelta
+from sqlalchemy import insert, select, update
+from models import Neighbor, Tool, Loan
+import geo
+
+CHUNK = 5000  # Rows per executemany
+AREA = (51.45, -0.2, 0.1)  # Neighbours live in [lat, lat + size) x [lon, lon + size) degrees (~11 x 7 km)
+
+class DatasetSpec:
+    """Shape of a synthetic neighbourhood: N neighbours, M tools, K loans."""
+
+    def __init__(self, neighbors, tools, loans, open_ratio=0.3, overdue_ratio=0.25, late_return_ratio=0.1, seed=42):
+        self.neighbors = neighbors
+        self.tools = tools
+        self.loans = loans
+        self.open_ratio = open_ratio                # Share of tools currently out on loan
+        self.overdue_ratio = overdue_ratio          # Share of open loans past their due date
+        self.late_return_ratio = late_return_ratio  # Share of returned loans that came back late
+        self.seed = seed
+
+    @classmethod
+    def for_size(cls, size, **kwargs):
+        """Scale everything from the loan count: size/10 neighbours, size/4 tools."""
+        return cls(neighbors=max(size // 10, 1), tools=max(size // 4, 1), loans=size, **kwargs)
+
+    def __repr__(self):
+        return f"<DatasetSpec {self.neighbors} neighbors, {self.tools} tools, {self.loans} loans, seed {self.seed}>"
+
+def neighbor_rows(spec):
+    rng = random.Random(spec.seed)  # Own stream: positions don't shift the tool/loan data
+    lat0, lon0, size = AREA
+    for i in range(1, spec.neighbors + 1):
+        latitude, longitude = lat0 + rng.random() * size, lon0 + rng.random() * size
+        yield {'name': f'Neighbor {i}', 'address': f'{i} Bench St', 'email': f'neighbor{i}@bench.test',
+               'latitude': latitude, 'longitude': longitude, 'geohash': geo.encode(latitude, longitude)}
+
+def tool_rows(spec, rng):
+    for i in range(1, spec.tools + 1):
+        yield {'name': f'Tool {i}', 'description': rng.choice([None, 'Cordless', 'Heavy duty', 'Garden']),
+               'owner_id': rng.randint(1, spec.neighbors)}
+
+def loan_rows(spec, rng, today=None):
+    """Per tool, a back-to-back history of returned loans; the newest may still be open."""
+    today = today or date.today()
+    per_tool = [0] * spec.tools
+    for _ in range(spec.loans):
+        per_tool[rng.randrange(spec.tools)] += 1
+    for tool_index, count in enumerate(per_tool):
+        tool_id = tool_index + 1
+        cursor = today
+        for n in range(count):
+            borrower_id = rng.randint(1, spec.neighbors)
+            if n == 0 and rng.random() < spec.open_ratio:
+                if rng.random() < spec.overdue_ratio:
+                    loan_date = today - timedelta(days=rng.randint(15, 60))
+                    due_date = loan_date + timedelta(days=rng.randint(3, 14))
+                else:
+                    loan_date = today - timedelta(days=rng.randint(0, 6))
+                    due_date = today + timedelta(days=rng.randint(1, 14))
+                yield {'borrower_id': borrower_id, 'tool_id': tool_id, 'loan_date': loan_date,
+                       'due_date': due_date, 'return_date': None, 'condition_note': None}
+                cursor = loan_date
+                continue
+            return_date = cursor - timedelta(days=rng.randint(1, 10))
+            length = rng.randint(3, 14)
+            if rng.random() < spec.late_return_ratio:
+                loan_date = return_date - timedelta(days=length + rng.randint(1, 7))
+            else:
+                loan_date = return_date - timedelta(days=rng.randint(1, length))
+            due_date = loan_date + timedelta(days=length)
+            yield {'borrower_id': borrower_id, 'tool_id': tool_id, 'loan_date': loan_date,
+                   'due_date': due_date, 'return_date': return_date,
+                   'condition_note': rng.choice(['Good', 'Fine', 'Scratched', None])}
+            cursor = loan_date
+
+def _insert_chunks(conn, model, rows):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= CHUNK:
+            conn.execute(insert(model), chunk)
+            chunk = []
+    if chunk:
+        conn.execute(insert(model), chunk)
+
+def generate(engine, spec, today=None):
+    """Insert the dataset described by spec into empty tables; same seed, same rows."""
+    rng = random.Random(spec.seed)
+    with engine.begin() as conn:
+        _insert_chunks(conn, Neighbor, neighbor_rows(spec))
+        _insert_chunks(conn, Tool, tool_rows(spec, rng))
+        _insert_chunks(conn, Loan, loan_rows(spec, rng, today))
+        # Loans went in without touching tools; mark the ones out on loan as the app would
+        open_loan = select(Loan.id).where(Loan.tool_id == Tool.id, Loan.return_date.is_(None)).limit(1).scalar_subquery()
+        conn.execute(update(Tool).values(current_loan_id=open_loan))
+    return spec
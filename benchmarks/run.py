@@ -0,0 +1,300 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import itertools
+import json
+import random
+import statistics
+import subprocess
+import shutil
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+from sqlalchemy import insert, select
+from sqlalchemy.orm import sessionmaker
+import database
+import digest
+import archive
+import export
+import geo
+import reports
+from db_connect import make_engine
+from models import Base, Neighbor, Tool, Loan
+from benchmarks.datagen import DatasetSpec, generate, AREA
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+DEFAULT_SIZES = [1000, 10000]
+DEFAULT_REPEAT = 20
+RESERVATION_SEED = 1000  # Reservations seeded for the benchmarks that use them up (keep --repeat below this)
+
+# Each benchmark: name -> prepare(session, spec) returning a zero-argument callable.
+# Writes draw fresh targets from iterators so every repetition does real work.
+def _free_tool_ids(session):
+    busy = select(Loan.tool_id).where(Loan.return_date.is_(None))
+    return iter(session.scalars(select(Tool.id).where(Tool.id.not_in(busy)).order_by(Tool.id)).all())
+
+def _drain(iterator):
+    for _ in iterator:
+        pass
+
+class _Counter:
+    def __init__(self, start=0):
+        self.n = start
+    def next(self):
+        self.n += 1
+        return self.n
+
+def _bench_create_neighbor(session, spec):
+    counter = _Counter()
+    return lambda: database.create_neighbor(session, 'Bench', '1 Bench St', f'bench{counter.next()}@bench.test')
+
+def _bench_create_tool(session, spec):
+    return lambda: database.create_tool(session, 'Bench tool', None, 1)
+
+def _bench_unit_of_work(session, spec):
+    # A neighbour with 10 tools in one transaction; compare with 11 create_* calls
+    counter = _Counter()
+    def call():
+        with database.unit_of_work(session):
+            owner = database.create_neighbor(session, 'Bench', '1 Bench St', f'uow{counter.next()}@bench.test')
+            for _ in range(10):
+                database.create_tool(session, 'Bench tool', None, owner.id)
+    return call
+
+def _bench_create_loan(session, spec):
+    free = _free_tool_ids(session)
+    today = date.today()
+    return lambda: database.create_loan(session, 1, next(free), today, today + timedelta(days=7))
+
+def _seed_reservations(session, bookings, days=3):
+    """Insert a `days`-long reservation per (tool_id, loan_date); returns an iterator over their ids."""
+    rows = [{'borrower_id': 1, 'tool_id': tool_id, 'loan_date': start, 'due_date': start + timedelta(days=days),
+             'is_reservation': True} for tool_id, start in bookings]
+    ids = session.scalars(insert(Loan).returning(Loan.id, sort_by_parameter_order=True), rows).all()
+    session.commit()
+    return iter(ids)
+
+def _bench_create_reservation(session, spec):
+    tool_ids = iter(session.scalars(select(Tool.id).order_by(Tool.id)).all())
+    start = date.today() + timedelta(days=30)
+    return lambda: database.create_reservation(session, 1, next(tool_ids), start, start + timedelta(days=3))
+
+def _bench_get_tool_reservations(session, spec):
+    # A tool booked a week apart for the next RESERVATION_SEED // 100 weeks
+    tool_id = spec.tools // 2
+    start = date.today() + timedelta(days=90)
+    _seed_reservations(session, [(tool_id, start + timedelta(weeks=week)) for week in range(RESERVATION_SEED // 100)])
+    return lambda: database.get_tool_reservations(session, tool_id)
+
+def _bench_start_reservation(session, spec):
+    # Reservations starting today, on tools that are free now
+    free = list(itertools.islice(_free_tool_ids(session), RESERVATION_SEED))
+    reservations = _seed_reservations(session, [(tool_id, date.today()) for tool_id in free])
+    return lambda: database.start_reservation(session, next(reservations))
+
+def _bench_cancel_reservation(session, spec):
+    tool_ids = session.scalars(select(Tool.id).order_by(Tool.id).limit(RESERVATION_SEED)).all()
+    reservations = _seed_reservations(session, [(tool_id, date.today() + timedelta(days=60)) for tool_id in tool_ids])
+    return lambda: database.cancel_reservation(session, next(reservations))
+
+def _bench_set_neighbor_location(session, spec):
+    rng = random.Random(spec.seed)
+    neighbor_ids = itertools.cycle(range(1, spec.neighbors + 1))
+    lat0, lon0, size = AREA
+    return lambda: database.set_neighbor_location(session, next(neighbor_ids), lat0 + rng.random() * size, lon0 + rng.random() * size)
+
+def _bench_geocode_neighbors(session, spec):
+    # A gazetteer knowing every address; overwrite=True keeps each call a full re-geocoding pass
+    gazetteer = geo.Gazetteer(session.execute(select(Neighbor.address, Neighbor.latitude, Neighbor.longitude)).all())
+    return lambda: database.geocode_neighbors(session, gazetteer, overwrite=True)
+
+def _bench_update_loan_return(session, spec):
+    open_ids = iter(session.scalars(select(Loan.id).where(Loan.return_date.is_(None)).order_by(Loan.id)).all())
+    return lambda: database.update_loan_return(session, next(open_ids), date.today(), 'Bench')
+
+def _bench_return_loans(session, spec):
+    # "Return everything a borrower has": one borrower's open loans per call
+    borrowers = iter(session.scalars(select(Loan.borrower_id).where(Loan.return_date.is_(None)).distinct()
+                                     .order_by(Loan.borrower_id.desc())).all())
+    return lambda: database.return_loans(session, borrower_id=next(borrowers), condition_note='Bench')
+
+def _bench_delete_loan(session, spec):
+    returned = iter(session.scalars(select(Loan.id).where(Loan.return_date.is_not(None)).order_by(Loan.id)).all())
+    return lambda: database.delete_loan(session, next(returned))
+
+def _bench_export_snapshot(session, spec):
+    # A full snapshot per call, each replacing the last one's files
+    directory = os.path.join(tempfile.gettempdir(), f'bench-export-{os.getpid()}')
+    def call():
+        shutil.rmtree(directory, ignore_errors=True)
+        return export.export_snapshot(session, directory)
+    return call
+
+BENCHMARKS = {
+    'create_neighbor': _bench_create_neighbor,
+    'create_tool': _bench_create_tool,
+    'create_loan': _bench_create_loan,
+    'create_reservation': _bench_create_reservation,
+    'unit_of_work': _bench_unit_of_work,
+    'get_neighbor': lambda session, spec: lambda: database.get_neighbor(session, spec.neighbors // 2),
+    'get_all_neighbors': lambda session, spec: lambda: database.get_all_neighbors(session),
+    'get_all_tools': lambda session, spec: lambda: database.get_all_tools(session),
+    'get_neighbor_tools': lambda session, spec: lambda: database.get_neighbor_tools(session, spec.neighbors // 2),
+    'get_overdue_loans': lambda session, spec: lambda: database.get_overdue_loans(session),
+    # Projection counterparts of the four reads above: compare their per-row time and memory
+    'list_neighbors': lambda session, spec: lambda: database.list_neighbors(session),
+    'list_tools': lambda session, spec: lambda: database.list_tools(session),
+    'list_neighbor_tools': lambda session, spec: lambda: database.list_tools(session, owner_id=spec.neighbors // 2),
+    'list_overdue_loans': lambda session, spec: lambda: database.list_overdue_loans(session),
+    'get_all_loans': lambda session, spec: lambda: database.get_all_loans(session),
+    'get_neighbors_page': lambda session, spec: lambda: database.get_neighbors_page(session, spec.neighbors // 2),
+    'get_tools_page': lambda session, spec: lambda: database.get_tools_page(session, spec.tools // 2),
+    'get_loans_page': lambda session, spec: lambda: database.get_loans_page(session, spec.loans // 2),
+    'get_available_tools': lambda session, spec: lambda: database.get_available_tools(session),
+    'check_tool_availability': lambda session, spec: lambda: database.check_tool_availability(session),
+    'get_tool_reservations': _bench_get_tool_reservations,
+    'get_free_windows': lambda session, spec: lambda: database.get_free_windows(session, spec.tools // 2, date.today(), date.today() + timedelta(days=30)),
+    'search_tools': lambda session, spec: lambda: database.search_tools(session, 'heavy duty'),
+    'get_nearby_tools': lambda session, spec: lambda: database.get_nearby_tools(
+        session, AREA[0] + AREA[2] / 2, AREA[1] + AREA[2] / 2, radius_km=1),
+    'run_digest': lambda session, spec: lambda: digest.run_digest(session, digest.MemorySender()),
+    'neighbor_loan_stats': lambda session, spec: lambda: reports.neighbor_loan_stats(session, limit=10),
+    'tool_utilisation': lambda session, spec: lambda: reports.tool_utilisation(session, limit=10),
+    'lending_overview': lambda session, spec: lambda: reports.lending_overview(session),
+    'refresh_summary': lambda session, spec: lambda: reports.refresh_summary(session),
+    'iter_neighbors': lambda session, spec: lambda: _drain(database.iter_neighbors(session)),
+    'iter_tools': lambda session, spec: lambda: _drain(database.iter_tools(session)),
+    'iter_loans': lambda session, spec: lambda: _drain(database.iter_loans(session)),
+    'set_neighbor_location': _bench_set_neighbor_location,
+    'geocode_neighbors': _bench_geocode_neighbors,
+    'start_reservation': _bench_start_reservation,
+    'cancel_reservation': _bench_cancel_reservation,
+    'update_loan_return': _bench_update_loan_return,
+    'return_loans': _bench_return_loans,
+    'delete_loan': _bench_delete_loan,
+    # Full columnar snapshot of every table (compare with get_all_loans / iter_loans)
+    'export_snapshot': _bench_export_snapshot,
+    # One batch of 100 per call; last, since it removes returned loans from the hot table
+    'archive_loans': lambda session, spec: lambda: archive.archive_loans(session, older_than_days=30, batch_size=100, max_batches=1),
+}
+
+def _percentile(samples, pct):
+    if len(samples) == 1:
+        return samples[0]
+    return statistics.quantiles(samples, n=100, method='inclusive')[pct - 1]
+
+def measure(call, repeat):
+    """Latency percentiles over `repeat` timed runs, then peak traced memory of one more run.
+
+    For calls returning a list, also the cost per row returned.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        call()
+        timings.append((time.perf_counter() - start) * 1000)
+    tracemalloc.start()
+    result = call()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    measured = {
+        'runs': repeat,
+        'p50_ms': round(_percentile(timings, 50), 3),
+        'p95_ms': round(_percentile(timings, 95), 3),
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'peak_kb': round(peak / 1024, 1),
+    }
+    if isinstance(result, list) and result:
+        measured['rows'] = len(result)
+        measured['p50_us_per_row'] = round(measured['p50_ms'] * 1000 / len(result), 3)
+        measured['peak_bytes_per_row'] = round(peak / len(result))
+    return measured
+
+def _per_row(measured):
+    if 'rows' not in measured:
+        return ''
+    return f"  ({measured['rows']} rows: {measured['p50_us_per_row']:.2f} us, {measured['peak_bytes_per_row']} B per row)"
+
+def run_size(url, size, repeat, names):
+    engine = make_engine(url)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    spec = DatasetSpec.for_size(size)
+    started = time.perf_counter()
+    generate(engine, spec)
+    print(f"{spec} generated in {time.perf_counter() - started:.1f}s")
+    SessionLocal = sessionmaker(bind=engine, autoflush=False)
+    results = {}
+    for name in names:
+        with SessionLocal() as session:
+            call = BENCHMARKS[name](session, spec)
+            call()  # Warm-up (connection, statement cache)
+            results[name] = measure(call, repeat)
+        print(f"  {name:<22} p50 {results[name]['p50_ms']:>9.3f} ms  p95 {results[name]['p95_ms']:>9.3f} ms  "
+              f"peak {results[name]['peak_kb']:>10.1f} KiB" + _per_row(results[name]))
+    Base.metadata.drop_all(engine)
+    engine.dispose()
+    return {'spec': vars(spec), 'functions': results}
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def compare(old_path, new_path):
+    """Print p50/p95 ratios (new/old) for every function and size present in both runs."""
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{old['commit']} -> {new['commit']}")
+    for size, run in new['sizes'].items():
+        if size not in old['sizes']:
+            continue
+        print(f"size {size}:")
+        for name, now in run['functions'].items():
+            before = old['sizes'][size]['functions'].get(name)
+            if before and before['p50_ms'] and before['p95_ms']:
+                print(f"  {name:<22} p50 x{now['p50_ms'] / before['p50_ms']:.2f}  p95 x{now['p95_ms'] / before['p95_ms']:.2f}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time every public database.py function across dataset sizes")
+    parser.add_argument('--url', default=os.environ.get('BENCH_DATABASE_URL'),
+                        help="Database to benchmark (tables are dropped!). Default: a temporary SQLite file")
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)), help="Comma-separated loan counts")
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument('--only', help="Comma-separated function names")
+    parser.add_argument('--out', default=RESULTS_DIR, help="Directory for the JSON result file")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help="Compare two result files and exit")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return 0
+    names = args.only.split(',') if args.only else list(BENCHMARKS)
+    unknown = set(names) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown functions: {', '.join(sorted(unknown))}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = args.url or f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        report = {
+            'commit': _git_commit(), 'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'backend': url.split(':', 1)[0], 'repeat': args.repeat, 'sizes': {},
+        }
+        for size in (int(s) for s in args.sizes.split(',')):
+            report['sizes'][str(size)] = run_size(url, size, args.repeat, names)
+
+    os.makedirs(args.out, exist_ok=True)
+    path = os.path.join(args.out, f"{report['timestamp'].replace(':', '')}-{report['commit']}.json")
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {path}")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,76 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import statistics
+import subprocess
+import tempfile
+import time
+from sqlalchemy import event
+from db_connect import make_engine
+from migrations import ensure_schema
+from models import Base
+
+# Startup cost: schema bootstrap on a fresh engine (what every launch pays before the
+# first prompt), create_all vs the schema_version check, plus the CLI's end-to-end
+# cold start measured in a subprocess.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROMPT = "Choose an option:"
+DEFAULT_REPEAT = 10
+
+BOOTSTRAPS = {
+    'create_all': lambda engine: Base.metadata.create_all(engine),
+    'ensure_schema': ensure_schema,
+}
+
+def time_bootstrap(url, bootstrap):
+    """(ms, statements) for one bootstrap on a brand-new engine (new connection, cold caches)."""
+    engine = make_engine(url)
+    statements = []
+    event.listen(engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+    try:
+        start = time.perf_counter()
+        bootstrap(engine)
+        return (time.perf_counter() - start) * 1000, len(statements)
+    finally:
+        engine.dispose()
+
+def time_first_prompt(url):
+    """Milliseconds from launching `cli.py` until the menu prompt is printed."""
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, '-u', os.path.join(ROOT, 'cli.py')], cwd=ROOT,
+                               env={**os.environ, 'DATABASE_URL': url},
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    seen = ''
+    try:
+        while PROMPT not in seen:
+            char = process.stdout.read(1)
+            if not char:
+                raise RuntimeError("cli.py exited before showing the menu")
+            seen += char
+        return (time.perf_counter() - start) * 1000
+    finally:
+        process.communicate('9\n')
+
+def _summary(samples):
+    return f"p50 {statistics.median(samples):>8.1f} ms  min {min(samples):>8.1f} ms"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure startup cost: create_all vs versioned schema check")
+    parser.add_argument('--url', default=os.environ.get('BENCH_DATABASE_URL'),
+                        help="Database to use (app tables are created if missing). Default: a temporary SQLite file")
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = args.url or f"sqlite:///{os.path.join(tmp, 'startup.db')}"
+        ensure_schema(make_engine(url))  # Both variants measured against an up-to-date schema
+        for name, bootstrap in BOOTSTRAPS.items():
+            runs = [time_bootstrap(url, bootstrap) for _ in range(args.repeat)]
+            print(f"{name:<14} {_summary([ms for ms, _ in runs])}  {runs[-1][1]:>3} statements")
+        print(f"{'first prompt':<14} {_summary([time_first_prompt(url) for _ in range(args.repeat)])}")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
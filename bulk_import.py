@@ -0,0 +1,263 @@
+import csv
+import io
+import json
+import os
+from collections import namedtuple
+from datetime import date
+from sqlalchemy import insert, select, func, cast, literal_column, BigInteger
+from sqlalchemy.exc import IntegrityError
+from models import Neighbor, Tool, Loan
+from database import clear_cache, rebuild_tool_availability, _record_changes, CHANGE_FIELDS
+
+BATCH_SIZE = 1000
+
+# One rejected input row: line number in the source file, reason, raw row
+RowError = namedtuple('RowError', ['line', 'message', 'row'])
+
+class ImportReport:
+    """Outcome of a bulk import: how many rows went in and which were rejected."""
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.inserted = 0
+        self.errors = []
+
+    @property
+    def rejected(self):
+        return len(self.errors)
+
+    def __repr__(self):
+        return f"<ImportReport {self.kind}: {self.inserted} inserted, {self.rejected} rejected>"
+
+# READ input
+def read_rows(path):
+    """Stream (line_no, row dict) pairs from a .csv or .jsonl file."""
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, newline='', encoding='utf-8') as f:
+        if ext == '.csv':
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+        elif ext in ('.jsonl', '.ndjson'):
+            for line_no, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield line_no, json.loads(line)
+                except json.JSONDecodeError:
+                    yield line_no, None
+        else:
+            raise ValueError(f"Unsupported file type: {ext or path} (use .csv or .jsonl)")
+
+def _batches(rows, size):
+    batch = []
+    for item in rows:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+# Field coercion (CSV gives strings, JSONL gives native types)
+def _text(row, field, required=True):
+    value = row.get(field)
+    value = str(value).strip() if value is not None else ''
+    if not value:
+        if required:
+            raise ValueError(f"{field} is required")
+        return None
+    return value
+
+def _int(row, field):
+    try:
+        return int(str(row.get(field)).strip())
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} must be an integer")
+
+def _date(row, field, required=True):
+    value = _text(row, field, required)
+    if value is None:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{field} must be a date (YYYY-MM-DD)")
+
+# Validation: each returns the cleaned values or raises ValueError
+def _clean_neighbor(row):
+    email = _text(row, 'email')
+    if '@' not in email:
+        raise ValueError("Invalid email format")
+    return {'name': _text(row, 'name'), 'address': _text(row, 'address'), 'email': email}
+
+def _clean_tool(row):
+    return {'name': _text(row, 'name'), 'description': _text(row, 'description', required=False),
+            'owner_id': _int(row, 'owner_id')}
+
+def _clean_loan(row):
+    values = {
+        'borrower_id': _int(row, 'borrower_id'), 'tool_id': _int(row, 'tool_id'),
+        'loan_date': _date(row, 'loan_date'), 'due_date': _date(row, 'due_date'),
+        'return_date': _date(row, 'return_date', required=False),
+        'condition_note': _text(row, 'condition_note', required=False),
+    }
+    if values['due_date'] <= values['loan_date']:
+        raise ValueError("Due date must be after loan date")
+    if values['return_date'] is not None and values['return_date'] < values['loan_date']:
+        raise ValueError("Return date can't be before loan date")
+    return values
+
+def _existing(session, column, values):
+    """Subset of values already present in column (one IN query per batch)."""
+    if not values:
+        return set()
+    return set(session.execute(select(column).where(column.in_(values))).scalars())
+
+# Per-batch reference checks against the database (and earlier rows in the batch)
+def _check_neighbors(session, cleaned):
+    taken = _existing(session, Neighbor.email, {v['email'] for _, v, _ in cleaned})
+    for line, values, raw in cleaned:
+        if values['email'] in taken:
+            yield line, raw, "Email already exists"
+        else:
+            taken.add(values['email'])
+            yield line, raw, values
+
+def _check_tools(session, cleaned):
+    owners = _existing(session, Neighbor.id, {v['owner_id'] for _, v, _ in cleaned})
+    for line, values, raw in cleaned:
+        if values['owner_id'] not in owners:
+            yield line, raw, "Invalid owner ID"
+        else:
+            yield line, raw, values
+
+def _check_loans(session, cleaned):
+    borrowers = _existing(session, Neighbor.id, {v['borrower_id'] for _, v, _ in cleaned})
+    tools = _existing(session, Tool.id, {v['tool_id'] for _, v, _ in cleaned})
+    open_ids = {v['tool_id'] for _, v, _ in cleaned if v['return_date'] is None}
+    loaned_out = set(session.execute(
+        select(Loan.tool_id).where(Loan.tool_id.in_(open_ids), Loan.return_date.is_(None), Loan.is_reservation.is_(False))
+    ).scalars()) if open_ids else set()
+    # Open loans must clear upcoming reservations too, as create_loan's probe does
+    # (ex_loans_tool_period only backs this up on Postgres)
+    reservations = session.execute(
+        select(Loan.tool_id, Loan.loan_date, Loan.due_date).where(
+            Loan.tool_id.in_(open_ids), Loan.return_date.is_(None), Loan.is_reservation.is_(True))
+    ).all() if open_ids else []
+    for line, values, raw in cleaned:
+        if values['borrower_id'] not in borrowers or values['tool_id'] not in tools:
+            yield line, raw, "Invalid borrower or tool ID"
+        elif values['return_date'] is None and any(
+                r.tool_id == values['tool_id'] and r.loan_date < values['due_date'] and r.due_date > values['loan_date']
+                for r in reservations):
+            yield line, raw, "Tool is reserved for those dates"
+        elif values['return_date'] is None and values['tool_id'] in loaned_out:
+            yield line, raw, "Tool is currently loaned out—cannot borrow again until returned."
+        else:
+            if values['return_date'] is None:
+                loaned_out.add(values['tool_id'])
+            yield line, raw, values
+
+# Kind -> (model, change feed entity, columns, clean, check)
+IMPORTERS = {
+    'neighbors': (Neighbor, 'neighbor', ['name', 'address', 'email'], _clean_neighbor, _check_neighbors),
+    'tools': (Tool, 'tool', ['name', 'description', 'owner_id'], _clean_tool, _check_tools),
+    'loans': (Loan, 'loan', ['borrower_id', 'tool_id', 'loan_date', 'due_date', 'return_date', 'condition_note'],
+              _clean_loan, _check_loans),
+}
+
+# INSERT
+def _copy_rows(session, model, columns, rows):
+    """Load rows with Postgres COPY FROM STDIN on the session's connection."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for values in rows:
+        writer.writerow([values[c] for c in columns])
+    buf.seek(0)
+    cursor = session.connection().connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {model.__tablename__} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buf)
+    finally:
+        cursor.close()
+
+def _feed_columns(model, entity):
+    return [model.__table__.c[field] for field in CHANGE_FIELDS[entity]]
+
+def _written_by_this_transaction():
+    # Postgres: rows whose xmin is this (top-level) transaction, i.e. not a concurrent writer's
+    return cast(literal_column('xmin::text'), BigInteger) == func.txid_current() % 4294967296
+
+def _insert_rows(session, model, entity, columns, rows, use_copy):
+    """Insert rows and append their 'created' change events in the same transaction."""
+    if use_copy:
+        # COPY returns nothing: read back the new ids (all above the previous maximum)
+        last_id = session.scalar(select(func.coalesce(func.max(model.id), 0)))
+        _copy_rows(session, model, columns, rows)
+        created = session.execute(select(*_feed_columns(model, entity)).where(
+            model.id > last_id, _written_by_this_transaction()).order_by(model.id)).all()
+    else:
+        # executemany / insertmanyvalues
+        created = session.execute(insert(model).returning(*_feed_columns(model, entity), sort_by_parameter_order=True), rows).all()
+    _record_changes(session, entity, 'created', created)
+
+def _insert_one_by_one(session, model, entity, report, accepted):
+    """Fallback when a batch insert hits a constraint: isolate the bad rows with savepoints."""
+    for line, raw, values in accepted:
+        try:
+            with session.begin_nested():
+                created = session.execute(insert(model).returning(*_feed_columns(model, entity)), [values]).all()
+                _record_changes(session, entity, 'created', created)
+            report.inserted += 1
+        except IntegrityError as e:
+            report.errors.append(RowError(line, f"Rejected by database: {e.orig}", raw))
+    session.commit()
+
+def import_rows(session, kind, rows, batch_size=BATCH_SIZE, use_copy=None):
+    """Validate and insert (line_no, row) pairs in batches; bad rows are reported, not fatal."""
+    if kind not in IMPORTERS:
+        raise ValueError(f"Unknown import kind: {kind}")
+    model, entity, columns, clean, check = IMPORTERS[kind]
+    if use_copy is None:
+        use_copy = session.get_bind().dialect.name == 'postgresql'
+    integrity_errors = (IntegrityError, session.get_bind().dialect.dbapi.IntegrityError)
+    report = ImportReport(kind)
+
+    for batch in _batches(rows, batch_size):
+        cleaned, rejected = [], []
+        for line, raw in batch:
+            try:
+                if not isinstance(raw, dict):
+                    raise ValueError("Malformed row")
+                cleaned.append((line, clean(raw), raw))
+            except ValueError as e:
+                rejected.append(RowError(line, str(e), raw))
+
+        accepted = []
+        for line, raw, result in check(session, cleaned):
+            if isinstance(result, str):
+                rejected.append(RowError(line, result, raw))
+            else:
+                accepted.append((line, raw, result))
+        report.errors.extend(sorted(rejected, key=lambda e: e.line))
+        if not accepted:
+            continue
+
+        try:
+            _insert_rows(session, model, entity, columns, [values for _, _, values in accepted], use_copy)
+            session.commit()
+            report.inserted += len(accepted)
+        except integrity_errors:
+            # Lost a race with a concurrent writer; retry row by row to pinpoint the culprits
+            session.rollback()
+            _insert_one_by_one(session, model, entity, report, accepted)
+        if kind == 'loans':
+            # Open loans went in without touching tools; bring current_loan_id in line
+            rebuild_tool_availability(session, {values['tool_id'] for _, _, values in accepted if values['return_date'] is None})
+    if report.inserted:
+        clear_cache()
+    return report
+
+def import_file(session, kind, path, batch_size=BATCH_SIZE, use_copy=None):
+    """Stream a CSV/JSONL file into the given table ('neighbors', 'tools' or 'loans')."""
+    return import_rows(session, kind, read_rows(path), batch_size=batch_size, use_copy=use_copy)
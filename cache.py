@@ -0,0 +1,98 @@
+import threading
+import time
+from collections import OrderedDict
+
+MISSING = object()  # Returned by get() on a miss (None is a cacheable value)
+
+class CacheBackend:
+    """Interface for read-through cache stores used by database.py.
+
+    Keys are tuples of str/int; values are plain column dicts (or lists of them),
+    so an external store (e.g. Redis) only needs to serialise simple data.
+    """
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def stats(self):
+        return {}
+
+class NullCache(CacheBackend):
+    """Caching disabled: every read goes to the database."""
+
+    def get(self, key):
+        return MISSING
+
+    def set(self, key, value):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+class LRUCache(CacheBackend):
+    """In-process LRU cache with a per-entry TTL, safe to share between threads."""
+
+    def __init__(self, maxsize=1024, ttl=60.0, clock=time.monotonic):
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()  # key -> (expires_at, value), least recently used first
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISSING
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= self._clock():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        expires_at = self._clock() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries), 'maxsize': self.maxsize, 'ttl': self.ttl,
+                'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'expirations': self.expirations,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+            }
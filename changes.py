@@ -0,0 +1,149 @@
+import select as selectors
+import time
+from sqlalchemy import select, delete, and_, or_, func, true
+from models import ChangeEvent, ChangeCursor, CHANGE_CHANNEL
+from database import unit_of_work
+from instrumentation import instrumented
+
+# Change feed consumers: instead of re-reading get_all_loans and diffing, a process keeps a
+# named cursor into change_events (written by the database.py CRUD functions) and applies
+# only what happened since. Cursors live in change_cursors, so a restarted consumer carries
+# on where it stopped. See models.ChangeEvent for why positions are (txid, id) pairs.
+CHANGE_BATCH = 500        # Events per consume() call
+POLL_INTERVAL = 5.0       # Seconds between polls when there are no notifications to wait for
+
+def _settled(session):
+    # Postgres: only events of transactions older than every running one, which can no
+    # longer be overtaken by a commit with a lower position
+    if session.get_bind().dialect.name == 'postgresql':
+        return ChangeEvent.txid < func.txid_snapshot_xmin(func.txid_current_snapshot())
+    return true()
+
+def _after(txid, event_id):
+    return or_(ChangeEvent.txid > txid, and_(ChangeEvent.txid == txid, ChangeEvent.id > event_id))
+
+# READ
+@instrumented
+def get_changes(session, after=(0, 0), entities=None, limit=CHANGE_BATCH):
+    """Committed change events after position `after` (txid, event id), oldest first.
+
+    entities narrows the feed, e.g. ('loan',). Each event's `values` holds its row's fields.
+    """
+    stmt = select(ChangeEvent).where(_after(*after), _settled(session))
+    if entities:
+        stmt = stmt.where(ChangeEvent.entity.in_(entities))
+    return session.scalars(stmt.order_by(ChangeEvent.txid, ChangeEvent.id).limit(limit)).all()
+
+class ChangeConsumer:
+    """A named, durable reader of the change feed.
+
+        consumer = ChangeConsumer(session, 'tool-cache', entities=('loan',))
+        consumer.consume(lambda event: cache.invalidate(event.values['tool_id']))
+
+    A new name starts at the beginning of the feed.
+    """
+
+    def __init__(self, session, name, entities=None, batch_size=CHANGE_BATCH):
+        self.session = session
+        self.name = name
+        self.entities = entities
+        self.batch_size = batch_size
+
+    def position(self):
+        """(txid, event id) of the last event consumed; (0, 0) before the first."""
+        cursor = self.session.get(ChangeCursor, self.name, populate_existing=True)
+        return (cursor.txid, cursor.event_id) if cursor else (0, 0)
+
+    def pending(self, limit=None):
+        """The next events, without consuming them."""
+        return get_changes(self.session, self.position(), self.entities, limit or self.batch_size)
+
+    def _lock_cursor(self):
+        stmt = select(ChangeCursor).where(ChangeCursor.name == self.name).execution_options(populate_existing=True)
+        if self.session.get_bind().dialect.name == 'postgresql':
+            stmt = stmt.with_for_update()  # Two processes sharing a name take turns
+        cursor = self.session.scalars(stmt).first()
+        if cursor is None:
+            cursor = ChangeCursor(name=self.name, txid=0, event_id=0)
+            self.session.add(cursor)
+        return cursor
+
+    def consume(self, handler, limit=None):
+        """Pass the next batch of events, in order, to handler(event); returns how many there were.
+
+        The batch runs in one unit_of_work with the cursor update, so database writes the
+        handler makes with this session commit together with it, exactly once. If the handler
+        raises, nothing is committed and the same events come again next time.
+        """
+        with unit_of_work(self.session):
+            cursor = self._lock_cursor()
+            events = get_changes(self.session, (cursor.txid, cursor.event_id), self.entities, limit or self.batch_size)
+            for event in events:
+                handler(event)
+            if events:
+                cursor.txid, cursor.event_id = events[-1].txid, events[-1].id
+        return len(events)
+
+    def run(self, handler, listener=None, poll_interval=POLL_INTERVAL, stop=None):
+        """Consume until stop() is true: drain the feed, then wait for a notification (or poll_interval)."""
+        while not (stop and stop()):
+            if self.consume(handler) == 0:
+                if listener is not None:
+                    listener.wait(poll_interval)
+                else:
+                    time.sleep(poll_interval)
+
+class ChangeListener:
+    """Wake-ups for new change events: LISTEN change_events on Postgres (psycopg2).
+
+    Holds one connection of its own, outside the pool. On other backends wait() just sleeps,
+    so consumers fall back to polling.
+    """
+
+    def __init__(self, engine, channel=CHANGE_CHANNEL):
+        self.connection = None
+        if engine.dialect.name == 'postgresql' and engine.dialect.driver == 'psycopg2':
+            self.connection = engine.raw_connection()
+            self.connection.detach()  # Closed for real by close(), never handed back LISTENing
+            dbapi_connection = self.connection.dbapi_connection
+            dbapi_connection.autocommit = True  # Notifications arrive between transactions only
+            cursor = dbapi_connection.cursor()
+            cursor.execute(f"LISTEN {channel}")
+            cursor.close()
+
+    def wait(self, timeout):
+        """Block until a change is committed or timeout seconds pass; True if woken by a notification."""
+        if self.connection is None:
+            time.sleep(timeout)
+            return False
+        dbapi_connection = self.connection.dbapi_connection
+        dbapi_connection.poll()
+        if not dbapi_connection.notifies and selectors.select([dbapi_connection], [], [], timeout)[0]:
+            dbapi_connection.poll()
+        woken = bool(dbapi_connection.notifies)
+        dbapi_connection.notifies.clear()
+        return woken
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+# DELETE
+@instrumented
+def prune_changes(session):
+    """Delete events every consumer has passed; returns how many. Keeps everything while there are no cursors."""
+    slowest = session.execute(
+        select(ChangeCursor.txid, ChangeCursor.event_id).order_by(ChangeCursor.txid, ChangeCursor.event_id).limit(1)
+    ).first()
+    if slowest is None:
+        return 0
+    with unit_of_work(session):
+        result = session.execute(delete(ChangeEvent).where(~_after(*slowest)), execution_options={'synchronize_session': False})
+    return result.rowcount
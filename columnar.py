@@ -0,0 +1,290 @@
+import json
+import mmap
+import shutil
+import struct
+import sys
+import tempfile
+from array import array
+from datetime import date, datetime, timedelta
+
+# Columnar table files for bulk exports (export.export_snapshot). One file per table:
+#
+#   MAGIC | header length (uint64) | JSON header | column segments, each 8-byte aligned
+#
+# The header lists the row count and, per column, its type and the (offset from the end
+# of the padded header, length) of its segments: `data` (fixed-width values, or UTF-8
+# bytes for strings), `offsets` (strings only: int64 start of each value, plus the end)
+# and `validity` (one bit per row, LSB first, 1 = not NULL; absent when the column has no
+# NULLs). NULL slots hold 0 in `data`.
+# Numbers are stored in the writer's native byte order, recorded in the header.
+MAGIC = b'NTCOL\x00\x01\x00'
+ALIGN = 8
+EPOCH = date(1970, 1, 1)
+EPOCH_DATETIME = datetime(1970, 1, 1)
+
+# Column types: array typecode of `data`, and the conversions to and from Python values
+TYPES = {
+    'int64': 'q',
+    'float64': 'd',
+    'bool': 'B',
+    'date': 'i',       # Days since 1970-01-01
+    'datetime': 'q',   # Microseconds since 1970-01-01 (naive)
+    'string': None,
+}
+
+def _to_storage(type_name, value):
+    if type_name == 'date':
+        return (value - EPOCH).days
+    if type_name == 'datetime':
+        return (value - EPOCH_DATETIME) // timedelta(microseconds=1)
+    return value
+
+def _from_storage(type_name, value):
+    if type_name == 'date':
+        return EPOCH + timedelta(days=value)
+    if type_name == 'datetime':
+        return EPOCH_DATETIME + timedelta(microseconds=value)
+    if type_name == 'bool':
+        return bool(value)
+    return value
+
+def _padding(length):
+    return -length % ALIGN
+
+# WRITE
+class _Spill:
+    """Append-only segment buffered in memory up to `limit` bytes, then in a temporary file."""
+
+    def __init__(self, limit):
+        self.file = tempfile.SpooledTemporaryFile(max_size=limit)
+        self.length = 0
+
+    def write(self, data):
+        self.file.write(data)
+        self.length += len(data)
+
+    def copy_to(self, out):
+        self.file.seek(0)
+        shutil.copyfileobj(self.file, out)
+
+    def close(self):
+        self.file.close()
+
+class _ColumnWriter:
+    def __init__(self, name, type_name, spill_limit):
+        if type_name not in TYPES:
+            raise ValueError(f"Unknown column type: {type_name}")
+        self.name, self.type = name, type_name
+        self.data = _Spill(spill_limit)
+        self.offsets = _Spill(spill_limit) if type_name == 'string' else None
+        self.validity = _Spill(spill_limit)
+        self.rows = self.nulls = 0
+        self._bits = self._nbits = 0
+        if self.offsets is not None:
+            self.offsets.write(array('q', [0]).tobytes())
+
+    def append(self, values):
+        if self.type == 'string':
+            encoded = [b'' if v is None else v.encode('utf-8') for v in values]
+            ends, end = array('q'), self.data.length
+            for item in encoded:
+                end += len(item)
+                ends.append(end)
+            self.data.write(b''.join(encoded))
+            self.offsets.write(ends.tobytes())
+        else:
+            self.data.write(array(TYPES[self.type], [0 if v is None else _to_storage(self.type, v) for v in values]).tobytes())
+        packed = bytearray()
+        for value in values:
+            if value is not None:
+                self._bits |= 1 << self._nbits
+            else:
+                self.nulls += 1
+            self._nbits += 1
+            if self._nbits == 8:
+                packed.append(self._bits)
+                self._bits = self._nbits = 0
+        self.validity.write(bytes(packed))
+        self.rows += len(values)
+
+    def finish(self):
+        if self._nbits:
+            self.validity.write(bytes([self._bits]))
+            self._bits = self._nbits = 0
+
+    def segments(self):
+        """(segment name, spill) pairs to write, in file order."""
+        found = [('data', self.data)]
+        if self.offsets is not None:
+            found.append(('offsets', self.offsets))
+        if self.nulls:
+            found.append(('validity', self.validity))
+        return found
+
+    def close(self):
+        for spill in (self.data, self.offsets, self.validity):
+            if spill is not None:
+                spill.close()
+
+class TableWriter:
+    """Write a columnar table file from rows appended in batches (memory use is bounded by spill_limit per segment).
+
+        with TableWriter(path, [('id', 'int64'), ('name', 'string')]) as writer:
+            writer.append([(1, 'Alice'), (2, None)])
+    """
+
+    def __init__(self, path, columns, meta=None, spill_limit=1 << 20):
+        self.path = path
+        self.meta = meta or {}
+        self.columns = [_ColumnWriter(name, type_name, spill_limit) for name, type_name in columns]
+        self.rows = 0
+
+    def append(self, rows):
+        """Append a batch of row tuples (values in column order, None for NULL)."""
+        rows = list(rows)
+        if not rows:
+            return
+        for index, column in enumerate(self.columns):
+            column.append([row[index] for row in rows])
+        self.rows += len(rows)
+
+    def close(self):
+        try:
+            for column in self.columns:
+                column.finish()
+            layout, described, offset = [], [], 0
+            for column in self.columns:
+                described.append({'name': column.name, 'type': column.type})
+                for segment, spill in column.segments():
+                    described[-1][segment] = [offset, spill.length]
+                    layout.append(spill)
+                    offset += spill.length + _padding(spill.length)
+            header = json.dumps({'rows': self.rows, 'byteorder': sys.byteorder, 'meta': self.meta,
+                                 'columns': described}).encode('utf-8')
+            with open(self.path, 'wb') as out:
+                out.write(MAGIC)
+                out.write(struct.pack('<Q', len(header)))
+                out.write(header)
+                out.write(b'\0' * _padding(len(header)))
+                for spill in layout:
+                    spill.copy_to(out)
+                    out.write(b'\0' * _padding(spill.length))
+        finally:
+            for column in self.columns:
+                column.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+# READ
+class Column:
+    """One column of a mapped table: indexable like a list, with the raw numbers in `values`.
+
+    `values` is a typed memoryview over the file (no copy): int64/float64/uint8/int32 numbers,
+    days since 1970-01-01 for dates and microseconds for datetimes; NULL slots hold 0, so
+    check `is_null(i)` (or index the column, which returns None) where NULLs are possible.
+    For strings, `values` is the UTF-8 bytes and `offsets` the int64 boundaries.
+    """
+
+    def __init__(self, name, type_name, rows, values, offsets=None, validity=None):
+        self.name, self.type, self.rows = name, type_name, rows
+        self.values, self.offsets, self.validity = values, offsets, validity
+
+    def __len__(self):
+        return self.rows
+
+    def is_null(self, index):
+        return self.validity is not None and not (self.validity[index >> 3] >> (index & 7)) & 1
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.rows
+        if not 0 <= index < self.rows:
+            raise IndexError("Column index out of range")
+        if self.is_null(index):
+            return None
+        if self.offsets is not None:
+            return bytes(self.values[self.offsets[index]:self.offsets[index + 1]]).decode('utf-8')
+        return _from_storage(self.type, self.values[index])
+
+    def __iter__(self):
+        return (self[i] for i in range(self.rows))
+
+    def _release(self):
+        for view in (self.values, self.offsets, self.validity):
+            if view is not None:
+                view.release()
+
+class Table:
+    """A columnar table file, memory-mapped read-only; columns are read lazily from the mapping.
+
+        with Table(path) as table:
+            total = sum(table['id'].values)
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            head = f.read(len(MAGIC) + 8)
+            if len(head) < len(MAGIC) + 8 or head[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"Not a columnar table: {path}")
+            (length,) = struct.unpack('<Q', head[len(MAGIC):])
+            header = json.loads(f.read(length))
+            if header['byteorder'] != sys.byteorder:
+                raise ValueError(f"Table was written on a {header['byteorder']}-endian machine")
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)  # Stays valid after the file closes
+        self._view = memoryview(self._map)
+        self._data_start = len(head) + length + _padding(length)
+        self.rows, self.meta = header['rows'], header['meta']
+        self._columns = {c['name']: c for c in header['columns']}
+        self._open = {}
+
+    @property
+    def columns(self):
+        return list(self._columns)
+
+    def _segment(self, description, segment, typecode=None):
+        if segment not in description:
+            return None
+        offset, length = description[segment]
+        start = self._data_start + offset
+        view = self._view[start:start + length]
+        return view.cast(typecode) if typecode else view
+
+    def __getitem__(self, name):
+        if name not in self._open:
+            if name not in self._columns:
+                raise KeyError(name)
+            description = self._columns[name]
+            typecode = TYPES[description['type']]
+            self._open[name] = Column(
+                name, description['type'], self.rows,
+                self._segment(description, 'data', typecode),
+                self._segment(description, 'offsets', 'q'),
+                self._segment(description, 'validity'),
+            )
+        return self._open[name]
+
+    def iter_rows(self, columns=None):
+        """Row tuples over the given columns (all by default)."""
+        selected = [self[name] for name in (columns or self.columns)]
+        return zip(*selected) if selected else iter(())
+
+    def close(self):
+        """Unmap the file; Column objects and their views can't be used afterwards."""
+        if self._map is None:
+            return
+        for column in self._open.values():
+            column._release()
+        self._open = {}
+        self._view.release()
+        self._map.close()
+        self._map = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
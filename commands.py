@@ -0,0 +1,285 @@
+import csv
+import json
+import shlex
+import sys
+from datetime import date, timedelta
+from sqlalchemy import inspect
+from sqlalchemy.engine import Row
+from sqlalchemy.exc import SQLAlchemyError
+import changes
+import database
+import geo
+import instrumentation
+import reports
+from models import Base
+from migrations import ensure_schema
+from db_connect import get_engine
+
+# Non-interactive subcommands for cli.py: one per menu action, printing JSON, JSON lines
+# or CSV so scripts can consume the results. `batch FILE` runs many of them over one
+# session instead of paying process/engine startup per operation.
+FORMATS = ('json', 'jsonl', 'csv')
+
+# OUTPUT
+def to_record(value):
+    """Plain dict for a model instance, a result Row (model columns are flattened in) or a dict."""
+    if isinstance(value, dict):
+        return value
+    if isinstance(value, Base):
+        return {attr.key: getattr(value, attr.key) for attr in inspect(value).mapper.column_attrs}
+    if isinstance(value, Row):
+        record = {}
+        for key, item in value._mapping.items():
+            if isinstance(item, Base):
+                record.update(to_record(item))
+            else:
+                record[key] = item
+        return record
+    raise TypeError(f"Can't output {type(value).__name__}")
+
+def _json_default(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    raise TypeError(f"Can't serialise {type(value).__name__}")
+
+def _dumps(value):
+    return json.dumps(value, default=_json_default)
+
+def write_output(result, fmt='json', out=None):
+    """Write a single record (dict) or an iterable of records; lists are streamed for jsonl/csv."""
+    out = out or sys.stdout
+    if isinstance(result, dict):
+        result = [result] if fmt != 'json' else result
+    if fmt == 'json':
+        out.write(_dumps(result if isinstance(result, dict) else list(result)) + "\n")
+    elif fmt == 'jsonl':
+        for record in result:
+            out.write(_dumps(record) + "\n")
+    elif fmt == 'csv':
+        writer = None
+        for record in result:
+            if writer is None:
+                writer = csv.DictWriter(out, fieldnames=list(record), lineterminator="\n")
+                writer.writeheader()
+            writer.writerow({k: v.isoformat() if hasattr(v, 'isoformat') else v for k, v in record.items()})
+    else:
+        raise ValueError(f"Unknown format: {fmt}")
+
+def _records(rows):
+    return (to_record(row) for row in rows)
+
+def _all_pages(fetch_page, page_size=database.PAGE_SIZE):
+    """Every row from a keyset fetch_page(last_id, limit), one page in memory at a time."""
+    last_id = None
+    while True:
+        rows = fetch_page(last_id, page_size)
+        yield from rows
+        if len(rows) < page_size:
+            return
+        last_id = rows[-1].id
+
+# COMMANDS: handler(session, args) returns a record (dict) or an iterable of records
+def _add_neighbor(session, args):
+    return to_record(database.create_neighbor(session, args.name, args.address, args.email, args.latitude, args.longitude))
+
+def _set_location(session, args):
+    neighbor = database.set_neighbor_location(session, args.neighbor_id, args.latitude, args.longitude)
+    if neighbor is None:
+        raise ValueError("Neighbor not found")
+    return to_record(neighbor)
+
+def _geocode(session, args):
+    gazetteer = geo.Gazetteer.load(args.gazetteer)
+    return {'known_addresses': len(gazetteer), 'located': database.geocode_neighbors(session, gazetteer, args.overwrite)}
+
+def _nearby(session, args):
+    rows = database.get_nearby_tools(session, args.latitude, args.longitude, args.radius, args.exclude_owner_id, args.limit)
+    return ({**to_record(row.tool), 'distance_km': round(row.distance_km, 3)} for row in rows)
+
+def _add_tool(session, args):
+    return to_record(database.create_tool(session, args.name, args.description, args.owner_id))
+
+def _add_loan(session, args):
+    loan_date = args.loan_date or date.today()
+    due_date = args.due_date or loan_date + timedelta(days=7)
+    return to_record(database.create_loan(session, args.borrower_id, args.tool_id, loan_date, due_date))
+
+def _return_loan(session, args):
+    loan = database.update_loan_return(session, args.loan_id, args.date or date.today(), args.note)
+    if loan is None:
+        raise ValueError("Loan not found")
+    return to_record(loan)
+
+def _return_many(session, args):
+    return database.return_loans(session, args.loan_ids, args.borrower_id, args.date, args.note)._asdict()
+
+def _list_available(session, args):
+    return _records(_all_pages(lambda last_id, limit: database.get_available_tools(session, args.owner_id, args.name, last_id, limit)))
+
+def _search(session, args):
+    return _records(database.search_tools(session, args.text, args.owner_id, args.available, limit=args.limit))
+
+def _reserve(session, args):
+    loan_date = args.start or date.today() + timedelta(days=1)
+    due_date = args.until or loan_date + timedelta(days=7)
+    return to_record(database.create_reservation(session, args.borrower_id, args.tool_id, loan_date, due_date))
+
+def _cancel_reservation(session, args):
+    if not database.cancel_reservation(session, args.reservation_id):
+        raise ValueError("Reservation not found")
+    return {'id': args.reservation_id, 'cancelled': True}
+
+def _pick_up(session, args):
+    loan = database.start_reservation(session, args.reservation_id)
+    if loan is None:
+        raise ValueError("Reservation not found")
+    return to_record(loan)
+
+def _free_dates(session, args):
+    start = args.start or date.today()
+    windows = database.get_free_windows(session, args.tool_id, start, start + timedelta(days=args.days))
+    return ({'free_from': free_from, 'free_until': free_until} for free_from, free_until in windows)
+
+def _stats(session, args):
+    stats = instrumentation.get_stats()
+    return ({'function': name, **{k: v for k, v in s.items() if k != 'histogram'}} for name, s in stats['functions'].items())
+
+def _report(session, args):
+    if args.kind == 'overview':
+        return to_record(reports.lending_overview(session))
+    if args.kind == 'refresh':
+        return reports.refresh_summary(session, full=args.full)
+    if args.kind == 'utilisation':
+        return _records(reports.tool_utilisation(session, args.start, args.end, limit=args.limit))
+    stats = reports.neighbor_loan_stats if args.kind == 'borrowers' else reports.tool_loan_stats
+    return _records(stats(session, from_summary=args.from_summary, limit=args.limit))
+
+def _changes(session, args):
+    entities = [args.entity] if args.entity else None
+    if args.peek or args.consumer is None:
+        after = changes.ChangeConsumer(session, args.consumer).position() if args.consumer else (0, 0)
+        events = changes.get_changes(session, after, entities, args.limit)
+    else:
+        events = []
+        changes.ChangeConsumer(session, args.consumer, entities).consume(events.append, args.limit)
+    return ({'id': e.id, 'entity': e.entity, 'entity_id': e.entity_id, 'action': e.action,
+             'created_at': e.created_at, 'data': e.values} for e in events)
+
+_iso_date = date.fromisoformat
+
+# name -> (help, handler, [(flags, add_argument kwargs)])
+COMMANDS = {
+    'add-neighbor': ("Add a neighbor", _add_neighbor, [
+        (['--name'], {'required': True}), (['--address'], {'required': True}), (['--email'], {'required': True}),
+        (['--lat'], {'dest': 'latitude', 'type': float}), (['--lon'], {'dest': 'longitude', 'type': float})]),
+    'set-location': ("Set a neighbor's coordinates (omit both to clear)", _set_location, [
+        (['neighbor_id'], {'type': int}),
+        (['--lat'], {'dest': 'latitude', 'type': float}), (['--lon'], {'dest': 'longitude', 'type': float})]),
+    'geocode': ("Locate neighbors from a gazetteer CSV (address,latitude,longitude)", _geocode, [
+        (['gazetteer'], {}), (['--overwrite'], {'action': 'store_true', 'help': "also re-locate neighbors that have coordinates"})]),
+    'add-tool': ("Add a tool", _add_tool, [
+        (['--name'], {'required': True}), (['--description'], {}), (['--owner-id'], {'type': int, 'required': True})]),
+    'add-loan': ("Lend a tool (default: today for 7 days)", _add_loan, [
+        (['--borrower-id'], {'type': int, 'required': True}), (['--tool-id'], {'type': int, 'required': True}),
+        (['--loan-date'], {'type': _iso_date}), (['--due-date'], {'type': _iso_date})]),
+    'return': ("Return a loan", _return_loan, [
+        (['loan_id'], {'type': int}), (['--note'], {'default': 'N/A'}), (['--date'], {'type': _iso_date})]),
+    'return-many': ("Return several loans at once (ids and/or all of a borrower's)", _return_many, [
+        (['loan_ids'], {'type': int, 'nargs': '*'}), (['--borrower-id'], {'type': int}),
+        (['--note'], {}), (['--date'], {'type': _iso_date})]),
+    'list-neighbors': ("List all neighbors", lambda session, args: _records(database.iter_neighbors(session)), []),
+    'list-tools': ("List all tools", lambda session, args: _records(database.iter_tools(session)), []),
+    'list-loans': ("List all loans, newest first", lambda session, args: _records(database.iter_loans(session, include_archive=args.archived)),
+                   [(['--archived'], {'action': 'store_true', 'help': "include loans moved to loans_archive"})]),
+    'list-overdue': ("List overdue loans", lambda session, args: _records(database.get_overdue_loans(session)), []),
+    'list-available': ("List tools not on loan", _list_available, [
+        (['--owner-id'], {'type': int}), (['--name'], {})]),
+    'nearby': ("Available tools near a point, nearest first", _nearby, [
+        (['--lat'], {'dest': 'latitude', 'type': float, 'required': True}),
+        (['--lon'], {'dest': 'longitude', 'type': float, 'required': True}),
+        (['--radius'], {'type': float, 'default': 1.0, 'help': "km"}), (['--exclude-owner-id'], {'type': int}),
+        (['--limit'], {'type': int, 'default': database.PAGE_SIZE})]),
+    'search': ("Search tools by name/description", _search, [
+        (['text'], {}), (['--owner-id'], {'type': int}), (['--available'], {'action': 'store_true'}),
+        (['--limit'], {'type': int, 'default': database.PAGE_SIZE})]),
+    'reserve': ("Reserve a tool for future dates", _reserve, [
+        (['--borrower-id'], {'type': int, 'required': True}), (['--tool-id'], {'type': int, 'required': True}),
+        (['--from'], {'dest': 'start', 'type': _iso_date}), (['--until'], {'type': _iso_date})]),
+    'cancel-reservation': ("Cancel a reservation", _cancel_reservation, [(['reservation_id'], {'type': int})]),
+    'pick-up': ("Turn a reservation into a loan", _pick_up, [(['reservation_id'], {'type': int})]),
+    'list-reservations': ("Upcoming reservations for a tool",
+                          lambda session, args: _records(database.get_tool_reservations(session, args.tool_id)),
+                          [(['tool_id'], {'type': int})]),
+    'free-dates': ("Free date ranges for a tool", _free_dates, [
+        (['tool_id'], {'type': int}), (['--from'], {'dest': 'start', 'type': _iso_date}),
+        (['--days'], {'type': int, 'default': 30})]),
+    'changes': ("Change events; with --consumer, those after its cursor, which then moves past them", _changes, [
+        (['--consumer'], {}), (['--peek'], {'action': 'store_true', 'help': "don't move the consumer's cursor"}),
+        (['--entity'], {'choices': ['neighbor', 'tool', 'loan']}), (['--limit'], {'type': int, 'default': changes.CHANGE_BATCH})]),
+    'stats': ("Per-function query stats (with DB_INSTRUMENT=1)", _stats, []),
+    'report': ("Lending reports", _report, [
+        (['kind'], {'choices': ['overview', 'borrowers', 'tools', 'utilisation', 'refresh']}),
+        (['--limit'], {'type': int}), (['--from-summary'], {'action': 'store_true'}),
+        (['--from'], {'dest': 'start', 'type': _iso_date}), (['--to'], {'dest': 'end', 'type': _iso_date}),
+        (['--full'], {'action': 'store_true', 'help': "refresh: rebuild instead of incremental"})]),
+}
+
+def add_parsers(subparsers):
+    """Register COMMANDS and `batch` on cli.py's argparse subparsers."""
+    for name, (help_text, handler, arguments) in COMMANDS.items():
+        sub = subparsers.add_parser(name, help=help_text)
+        for flags, kwargs in arguments:
+            sub.add_argument(*flags, **kwargs)
+        sub.add_argument('--format', choices=FORMATS, default='json')
+        sub.set_defaults(handler=handler)
+    batch = subparsers.add_parser('batch', help="Run commands from a file (one per line) over one session")
+    batch.add_argument('path', help="File of command lines, e.g. `add-neighbor --name Al --address 'x' --email a@b.c` ('-' for stdin)")
+    batch.add_argument('--stop-on-error', action='store_true')
+
+def _ensure_tables():
+    ensure_schema(get_engine())
+
+def run_command(args, out=None, err=None):
+    """Run one parsed subcommand in its own session; errors go to stderr as JSON. Returns the exit code."""
+    _ensure_tables()
+    with database.get_session() as session:
+        try:
+            write_output(args.handler(session, args), args.format, out)
+        except ValueError as e:
+            (err or sys.stderr).write(_dumps({'error': str(e)}) + "\n")
+            return 1
+    return 0
+
+def run_batch(parser, lines, stop_on_error=False, out=None):
+    """Run command lines over one session, writing one JSON result per line. Returns the exit code."""
+    out = out or sys.stdout
+    _ensure_tables()
+    failed = False
+    with database.get_session() as session:
+        for line_no, line in enumerate(lines, start=1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            record = {'line': line_no, 'command': line}
+            try:
+                argv = shlex.split(line)
+                if {'-h', '--help'} & set(argv):
+                    raise ValueError("--help isn't available in batch mode")  # argparse would print it into the results
+                args = parser.parse_args(argv)
+                if getattr(args, 'handler', None) is None:
+                    raise ValueError("Not a batch command")
+                result = args.handler(session, args)
+                record.update(ok=True, result=result if isinstance(result, dict) else list(result))
+            except SystemExit:
+                record.update(ok=False, error="Invalid arguments")
+            except ValueError as e:
+                session.rollback()
+                record.update(ok=False, error=str(e))
+            except SQLAlchemyError as e:
+                session.rollback()  # Leaves the session usable for the next line
+                record.update(ok=False, error=f"Database error: {str(e).splitlines()[0]}")
+            out.write(_dumps(record) + "\n")
+            failed = failed or not record['ok']
+            if failed and stop_on_error:
+                break
+    return 1 if failed else 0
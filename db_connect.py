@@ -1,7 +1,15 @@
-import psycopg2  # PostgreSQL database adapter for Python
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import os
+import functools
+import inspect
+import threading
+import time
+from contextvars import ContextVar
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session, sessionmaker
 from models import Base  # Assumes models.py exists with Base
+from migrations import ensure_schema
 
 DB_NAME = "neighbourhoodToolapp"
 DB_USER = "postgres"
@@ -9,22 +17,205 @@ DB_PASSWORD = "limo91we"
 DB_HOST = "localhost"
 DB_PORT = "5432"
 
-# SQLAlchemy DB URL
-DB_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# SQLAlchemy DB URL (override with DATABASE_URL, e.g. sqlite:///tools.db for local runs)
+DB_URL = os.environ.get('DATABASE_URL', f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}")
+
+# Read replicas for list/report queries (comma-separated URLs; none = everything on DB_URL)
+REPLICA_URLS = [url.strip() for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value not in (None, '') else default
+
+def _env_bool(name, default):
+    value = os.environ.get(name)
+    if value in (None, ''):
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+def pool_settings():
+    """Pool tuning from the environment (DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_PRE_PING, DB_STATEMENT_TIMEOUT_MS)."""
+    return {
+        'pool_size': _env_int('DB_POOL_SIZE', 5),
+        'max_overflow': _env_int('DB_MAX_OVERFLOW', 10),
+        'pre_ping': _env_bool('DB_POOL_PRE_PING', True),
+        'statement_timeout_ms': _env_int('DB_STATEMENT_TIMEOUT_MS', 0),  # 0 = no limit
+    }
+
+def engine_kwargs(url, pool_size=5, max_overflow=10, pre_ping=True, statement_timeout_ms=0):
+    """create_engine()/create_async_engine() keyword arguments for a backend URL."""
+    url = make_url(url)
+    kwargs = {'pool_pre_ping': pre_ping}
+    if url.get_backend_name() == 'sqlite':
+        # In-memory SQLite lives in a single connection; file databases get a normal pool
+        if url.database not in (None, '', ':memory:'):
+            kwargs.update(pool_size=pool_size, max_overflow=max_overflow)
+    else:
+        kwargs.update(pool_size=pool_size, max_overflow=max_overflow)
+        if statement_timeout_ms and url.get_backend_name() == 'postgresql':
+            if url.get_driver_name() == 'asyncpg':
+                kwargs['connect_args'] = {'server_settings': {'statement_timeout': str(statement_timeout_ms)}}
+            else:
+                kwargs['connect_args'] = {'options': f"-c statement_timeout={statement_timeout_ms}"}
+    return kwargs
+
+def enable_sqlite_foreign_keys(engine):
+    """SQLite ignores FOREIGN KEY constraints unless asked per connection."""
+    @event.listens_for(engine, 'connect')
+    def _enable_foreign_keys(dbapi_conn, record):
+        cursor = dbapi_conn.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+def make_engine(url=None, **settings):
+    """Build an engine with the shared pool settings (explicit settings override the environment)."""
+    options = {**pool_settings(), **settings}
+    engine = create_engine(url or DB_URL, **engine_kwargs(url or DB_URL, **options))
+    if engine.dialect.name == 'sqlite':
+        enable_sqlite_foreign_keys(engine)
+    return engine
+
+_engine = None
+
+def get_engine():
+    """The process-wide engine and pool, built on first use from DATABASE_URL and DB_* settings."""
+    global _engine
+    if _engine is None:
+        _engine = make_engine()
+    return _engine
+
+def dispose_engine():
+    """Close pooled connections and forget the engine and replicas (next use rebuilds them)."""
+    global _engine, _replicas
+    if _engine is not None:
+        _engine.dispose()
+        _engine = None
+    if _replicas is not None:
+        for engine in _replicas.engines:
+            engine.dispose()
+        _replicas = None
+
+# READ REPLICAS
+class ReplicaSet:
+    """Replica engines handed out in turn (round robin), skipping any that fail a health check.
+
+    A replica's health (a `SELECT 1`) is re-checked at most every check_interval seconds;
+    choose() returns None when no replica is healthy, and callers fall back to the primary.
+    """
+
+    def __init__(self, engines, check_interval=None):
+        self.engines = list(engines)
+        self.check_interval = _env_int('DB_REPLICA_CHECK_SECONDS', 5) if check_interval is None else check_interval
+        self._next = 0
+        self._health = {}  # engine -> (healthy, checked at)
+        self._lock = threading.Lock()
+
+    def is_healthy(self, engine):
+        healthy, checked_at = self._health.get(engine, (None, None))
+        if checked_at is None or time.monotonic() - checked_at >= self.check_interval:
+            try:
+                with engine.connect() as conn:
+                    conn.execute(text("SELECT 1"))
+                healthy = True
+            except SQLAlchemyError:
+                healthy = False
+            self._health[engine] = (healthy, time.monotonic())
+        return healthy
+
+    def choose(self):
+        with self._lock:
+            for offset in range(len(self.engines)):
+                engine = self.engines[(self._next + offset) % len(self.engines)]
+                if self.is_healthy(engine):
+                    self._next = (self._next + offset + 1) % len(self.engines)
+                    return engine
+        return None
+
+_replicas = None
+
+def get_replicas():
+    """The process-wide ReplicaSet built from DATABASE_REPLICA_URLS, or None if there are none."""
+    global _replicas
+    if _replicas is None and REPLICA_URLS:
+        _replicas = ReplicaSet([make_engine(url) for url in REPLICA_URLS])
+    return _replicas
+
+# Routing: a RoutingSession sends a query to a replica only while a @replica_read function
+# runs, it isn't a write or a locking read, and (with read-your-writes, the default) the
+# session hasn't written yet. Everything else, including flushes, goes to the primary.
+REPLICAS = 'replicas'                # session.info key: the ReplicaSet to read from (None = primary only)
+READ_YOUR_WRITES = 'read_your_writes'  # session.info key: once the session writes, read from the primary
+WROTE = 'wrote'                      # session.info key: set by the first write
+REPLICA = 'replica'                  # session.info key: the engine serving the current transaction
+
+_replica_read = ContextVar('replica_read', default=False)
+
+def replica_read(fn):
+    """Mark a read-only function whose queries may be served by a replica (which may lag)."""
+    if inspect.isgeneratorfunction(fn):
+        @functools.wraps(fn)
+        def generator_wrapper(*args, **kwargs):
+            gen = fn(*args, **kwargs)
+            try:
+                while True:
+                    # Generators run in the caller's context, so set the flag around each resume only
+                    token = _replica_read.set(True)
+                    try:
+                        item = next(gen)
+                    except StopIteration:
+                        return
+                    finally:
+                        _replica_read.reset(token)
+                    yield item
+            finally:
+                gen.close()
+        return generator_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        token = _replica_read.set(True)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _replica_read.reset(token)
+    return wrapper
+
+class RoutingSession(Session):
+    """Session that reads from session.info[REPLICAS] inside @replica_read functions.
+
+    One replica serves a whole transaction, so a report's queries see one snapshot.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        primary = super().get_bind(mapper=mapper, clause=clause, **kw)
+        if clause is not None and (clause.is_dml or getattr(clause, '_for_update_arg', None) is not None):
+            self.info[WROTE] = True
+            return primary
+        replicas = self.info.get(REPLICAS)
+        if (replicas is None or clause is None or not _replica_read.get()
+                or (self.info.get(WROTE) and self.info.get(READ_YOUR_WRITES, True))):
+            return primary
+        replica = self.info.get(REPLICA)
+        if replica is None:
+            replica = self.info[REPLICA] = replicas.choose() or primary
+        return replica
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _flushed(session, flush_context):
+    session.info[WROTE] = True
+
+@event.listens_for(RoutingSession, 'after_transaction_end')
+def _transaction_ended(session, transaction):
+    if transaction.parent is None:
+        session.info.pop(REPLICA, None)
 
 def connect_and_query(query: str):
-    # Raw psycopg2 connection
+    # Raw DBAPI connection borrowed from the shared pool (returned to it on close)
     connection = None
     try:
-        connection = psycopg2.connect(
-            dbname=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            host=DB_HOST,
-            port=DB_PORT
-        )
+        connection = get_engine().raw_connection()
         cursor = connection.cursor()
-        print("Connected to the database successfully (psycopg2)")
+        print("Connected to the database successfully (raw DBAPI)")
         cursor.execute(query)
         results = cursor.fetchall()
         cursor.close()
@@ -34,18 +225,18 @@ def connect_and_query(query: str):
     finally:
         if connection:
             connection.close()
-            print("Database connection closed (psycopg2).")
+            print("Database connection returned to the pool.")
 
 def create_tables_and_test_orm():
     # SQLAlchemy setup
-    engine = create_engine(DB_URL)
-    Base.metadata.create_all(bind=engine)
-    print("Tables created/verified via SQLAlchemy!")
-    
+    engine = get_engine()
+    applied = ensure_schema(engine)
+    print(f"Tables created/verified via SQLAlchemy! (migrations applied: {applied or 'none'})")
+
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
     with SessionLocal() as session:
         try:
-            result = session.execute("SELECT 1")
+            result = session.execute(text("SELECT 1"))
             print("ORM session connected successfully!")
             print(f"ORM query result: {result.scalar()}")
         except Exception as error:
@@ -54,11 +245,11 @@ def create_tables_and_test_orm():
 # Test both
 if __name__ == "__main__":
     test_query = "SELECT 1;"
-    print("Testing psycopg2...")
+    print("Testing raw DBAPI connection...")
     results = connect_and_query(test_query)
     if results:
-        print(f"Psycopg2 successful! Results: {results}")
-    
+        print(f"Raw query successful! Results: {results}")
+
     print("\nTesting SQLAlchemy...")
     create_tables_and_test_orm()
-    print("All tests passed!")
\ No newline at end of file
+    print("All tests passed!")
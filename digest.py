@@ -0,0 +1,148 @@
+import json
+import os
+from collections import namedtuple
+from datetime import date
+from itertools import groupby
+from sqlalchemy import select, or_, and_
+from models import Neighbor, Tool, Loan
+from instrumentation import instrumented
+
+DIGEST_BATCH = 500  # Overdue loans fetched per keyset query
+
+# One overdue loan as it appears in a digest (columns only, no ORM objects)
+DigestItem = namedtuple('DigestItem', ['loan_id', 'tool_id', 'tool_name', 'due_date', 'days_overdue'])
+
+class Digest:
+    """Everything one borrower has overdue on the run date."""
+
+    def __init__(self, borrower_id, name, email, items):
+        self.borrower_id = borrower_id
+        self.name = name
+        self.email = email
+        self.items = items
+
+    def render(self):
+        lines = [f"Hi {self.name},", "", f"You have {len(self.items)} overdue tool(s):"]
+        for item in self.items:
+            lines.append(f"- {item.tool_name} (loan {item.loan_id}): due {item.due_date}, "
+                         f"{item.days_overdue} day(s) overdue")
+        lines += ["", "Please return them to their owners as soon as you can."]
+        return "\n".join(lines) + "\n"
+
+    def __repr__(self):
+        return f"<Digest borrower={self.borrower_id}: {len(self.items)} loans>"
+
+class DigestReport:
+    """Outcome of one run_digest call."""
+
+    def __init__(self, run_date, resumed_after=None):
+        self.run_date = run_date
+        self.resumed_after = resumed_after  # Last borrower id done by an earlier, interrupted run
+        self.sent = 0
+        self.loans = 0
+
+    def __repr__(self):
+        return f"<DigestReport {self.run_date}: {self.sent} digests, {self.loans} loans>"
+
+# SENDERS: anything with send(digest)
+class DigestSender:
+    def send(self, digest):
+        raise NotImplementedError
+
+class FileSender(DigestSender):
+    """Write each digest to <directory>/digest-<borrower_id>.txt (replaced atomically)."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def send(self, digest):
+        path = os.path.join(self.directory, f"digest-{digest.borrower_id}.txt")
+        _write_atomic(path, digest.render())
+
+class MemorySender(DigestSender):
+    """Keep digests in a list; a stand-in for a mail gateway in tests and dry runs."""
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, digest):
+        self.sent.append(digest)
+
+# CHECKPOINT: {"run_date": ..., "last_borrower_id": ..., "complete": ...}
+def _write_atomic(path, content):
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(tmp, path)
+
+def load_checkpoint(path, run_date):
+    """Checkpoint for run_date, or None (missing, unreadable, or from another day)."""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path, encoding='utf-8') as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return checkpoint if checkpoint.get('run_date') == run_date.isoformat() else None
+
+def save_checkpoint(path, run_date, last_borrower_id, complete=False):
+    if path:
+        _write_atomic(path, json.dumps({'run_date': run_date.isoformat(), 'last_borrower_id': last_borrower_id,
+                                        'complete': complete}))
+
+# READ
+@instrumented
+def iter_overdue_rows(session, today=None, after_borrower_id=None, batch_size=DIGEST_BATCH):
+    """Stream overdue loans as plain rows ordered by (borrower_id, loan id), one keyset query per batch."""
+    today = today or date.today()
+    stmt = select(
+        Loan.id.label('loan_id'), Loan.borrower_id, Neighbor.name.label('borrower_name'),
+        Neighbor.email.label('borrower_email'), Loan.tool_id, Tool.name.label('tool_name'), Loan.due_date
+    ).select_from(Loan).join(Neighbor, Loan.borrower_id == Neighbor.id).join(Tool, Loan.tool_id == Tool.id).where(
+        Loan.due_date < today, Loan.return_date.is_(None), Loan.is_reservation.is_(False)
+    ).order_by(Loan.borrower_id, Loan.id).limit(batch_size)
+    page = stmt if after_borrower_id is None else stmt.where(Loan.borrower_id > after_borrower_id)
+    while True:
+        rows = session.execute(page).all()
+        yield from rows
+        if len(rows) < batch_size:
+            return
+        borrower_id, loan_id = rows[-1].borrower_id, rows[-1].loan_id
+        page = stmt.where(or_(Loan.borrower_id > borrower_id, and_(Loan.borrower_id == borrower_id, Loan.id > loan_id)))
+
+def iter_digests(rows, today):
+    """Group (borrower_id-ordered) overdue rows into one Digest per borrower."""
+    for borrower_id, group in groupby(rows, key=lambda row: row.borrower_id):
+        group = list(group)
+        items = [DigestItem(row.loan_id, row.tool_id, row.tool_name, row.due_date, (today - row.due_date).days)
+                 for row in group]
+        yield Digest(borrower_id, group[0].borrower_name, group[0].borrower_email, items)
+
+# JOB
+def run_digest(session, sender, checkpoint_path=None, today=None, batch_size=DIGEST_BATCH):
+    """Send one digest per borrower with overdue loans; resumable via checkpoint_path.
+
+    The checkpoint records the last borrower whose digest went out, so a rerun on the
+    same day after an interruption carries on from the next borrower (a run that
+    already finished sends nothing). Memory is bounded by one batch plus one digest.
+    """
+    today = today or date.today()
+    checkpoint = load_checkpoint(checkpoint_path, today)
+    report = DigestReport(today, checkpoint['last_borrower_id'] if checkpoint else None)
+    if checkpoint and checkpoint.get('complete'):
+        return report
+    last_borrower_id = report.resumed_after
+    rows = iter_overdue_rows(session, today, last_borrower_id, batch_size)
+    try:
+        for digest in iter_digests(rows, today):
+            sender.send(digest)
+            report.sent += 1
+            report.loans += len(digest.items)
+            last_borrower_id = digest.borrower_id
+            save_checkpoint(checkpoint_path, today, last_borrower_id)
+    finally:
+        rows.close()
+    save_checkpoint(checkpoint_path, today, last_borrower_id, complete=True)
+    return report
@@ -0,0 +1,202 @@
+import json
+import os
+import re
+import shutil
+from datetime import date, datetime, timedelta
+from sqlalchemy import select, func, Boolean, Integer, Float, Date, DateTime
+from models import Base
+from columnar import TableWriter, Table
+from instrumentation import instrumented
+
+# Snapshot export: every table streamed straight from the database into columnar files
+# (columnar.py), without building ORM objects. Postgres streams with COPY ... TO STDOUT;
+# other backends fetch in chunks from a server-side cursor. An export directory holds:
+#
+#   manifest.json              every snapshot: id, parent, watermark, row counts
+#   snapshot-000001/<table>.col
+#
+# An incremental snapshot holds only the rows changed since its parent (by updated_at, or
+# archived_at for loans_archive); apply snapshots in id order, upserting rows by primary key.
+# Deleted rows leave no trace, so take a full snapshot after deletions (archived loans are
+# not deletions: they reappear in loans_archive).
+EXPORT_TABLES = {   # Table -> column recording when each row last changed
+    'neighbors': 'updated_at',
+    'tools': 'updated_at',
+    'loans': 'updated_at',
+    'loans_archive': 'archived_at',
+}
+EXPORT_BATCH = 10000                    # Rows per fetch / per columnar append
+EXPORT_OVERLAP = timedelta(minutes=5)   # Re-export this far behind the parent's watermark (late commits)
+MANIFEST = 'manifest.json'
+
+class Snapshot:
+    """One exported snapshot, as recorded in the manifest."""
+
+    def __init__(self, directory, id, parent, taken_at, tables):
+        self.directory = directory
+        self.id = id
+        self.parent = parent        # Id of the snapshot this one is relative to; None for a full snapshot
+        self.taken_at = taken_at    # Database time the export started (the next incremental's watermark)
+        self.tables = tables        # Table name -> rows exported
+
+    @property
+    def incremental(self):
+        return self.parent is not None
+
+    def path(self, table):
+        return os.path.join(self.directory, _snapshot_dir(self.id), f'{table}.col')
+
+    def open(self, table):
+        """The table's columnar file, memory-mapped (close it, or use it as a context manager)."""
+        return Table(self.path(table))
+
+    def as_dict(self):
+        return {'id': self.id, 'parent': self.parent, 'taken_at': self.taken_at.isoformat(), 'tables': self.tables}
+
+    def __repr__(self):
+        kind = f"since {self.parent}" if self.incremental else "full"
+        return f"<Snapshot {self.id} ({kind}): {sum(self.tables.values())} rows>"
+
+def _snapshot_dir(snapshot_id):
+    return f'snapshot-{snapshot_id:06d}'
+
+# READ
+def list_snapshots(directory):
+    """Snapshots recorded in directory's manifest, oldest first ([] if there are none)."""
+    try:
+        with open(os.path.join(directory, MANIFEST), encoding='utf-8') as f:
+            entries = json.load(f)['snapshots']
+    except FileNotFoundError:
+        return []
+    return [Snapshot(directory, e['id'], e['parent'], datetime.fromisoformat(e['taken_at']), e['tables']) for e in entries]
+
+def _write_manifest(directory, snapshots):
+    path = os.path.join(directory, MANIFEST)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump({'snapshots': [s.as_dict() for s in snapshots]}, f, indent=2)
+    os.replace(path + '.tmp', path)  # Readers see the old manifest or the new one, never half of it
+
+# Column types and COPY text-format parsing
+def _column_type(column):
+    if isinstance(column.type, Boolean):
+        return 'bool'
+    if isinstance(column.type, Integer):
+        return 'int64'
+    if isinstance(column.type, Float):
+        return 'float64'
+    if isinstance(column.type, DateTime):
+        return 'datetime'
+    if isinstance(column.type, Date):
+        return 'date'
+    return 'string'
+
+COPY_ESCAPES = {'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t', 'v': '\v'}
+_COPY_ESCAPE = re.compile(r'\\(.)')
+
+def _unescape(field):
+    return _COPY_ESCAPE.sub(lambda m: COPY_ESCAPES.get(m.group(1), m.group(1)), field) if '\\' in field else field
+
+COPY_PARSERS = {
+    'int64': int,
+    'float64': float,
+    'bool': lambda text: text == 't',
+    'date': date.fromisoformat,
+    'datetime': datetime.fromisoformat,
+    'string': _unescape,
+}
+
+class _CopySink:
+    """File-like target for psycopg2's copy_expert: parses COPY text-format lines into row batches."""
+
+    def __init__(self, writer, types, batch_size):
+        self.writer, self.batch_size = writer, batch_size
+        self.parsers = [COPY_PARSERS[t] for t in types]
+        self.pending, self.rows = b'', []
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        lines = (self.pending + data).split(b'\n')
+        self.pending = lines.pop()  # Incomplete last line (b'' after a newline)
+        for line in lines:
+            fields = line.decode('utf-8').split('\t')
+            self.rows.append(tuple(None if text == '\\N' else parse(text) for parse, text in zip(self.parsers, fields)))
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+        return len(data)
+
+    def flush(self):
+        self.writer.append(self.rows)
+        self.rows = []
+
+def _copy_to(session, stmt, writer, types, batch_size):
+    connection = session.connection()
+    cursor = connection.connection.dbapi_connection.cursor()
+    try:
+        compiled = stmt.compile(dialect=connection.dialect)
+        query = cursor.mogrify(str(compiled), compiled.params).decode('utf-8')
+        sink = _CopySink(writer, types, batch_size)
+        cursor.copy_expert(f"COPY ({query}) TO STDOUT", sink)
+        sink.flush()
+    finally:
+        cursor.close()
+
+def _fetch_to(session, stmt, writer, batch_size):
+    result = session.execute(stmt.execution_options(yield_per=batch_size))
+    for rows in result.partitions():
+        writer.append(rows)
+
+# EXPORT
+@instrumented
+def export_snapshot(session, directory, incremental=False, since=None, batch_size=EXPORT_BATCH):
+    """Export every table in EXPORT_TABLES as a new snapshot under directory; returns the Snapshot.
+
+    incremental=True exports only rows changed since the latest snapshot (pass since=<id> to
+    pick another); with no snapshot to start from, the export is full. On Postgres the tables
+    are read in one REPEATABLE READ transaction, so they are consistent with each other.
+    """
+    os.makedirs(directory, exist_ok=True)
+    snapshots = list_snapshots(directory)
+    parent = None
+    if since is not None:
+        parent = next((s for s in snapshots if s.id == since), None)
+        if parent is None:
+            raise ValueError(f"No snapshot {since} in {directory}")
+    elif incremental and snapshots:
+        parent = snapshots[-1]
+
+    dialect = session.get_bind().dialect
+    copy = dialect.name == 'postgresql' and dialect.driver == 'psycopg2'  # copy_expert is psycopg2's
+    snapshot_transaction = dialect.name == 'postgresql' and not session.in_transaction()
+    if snapshot_transaction:
+        session.connection(execution_options={'isolation_level': 'REPEATABLE READ'})
+    snapshot_id = snapshots[-1].id + 1 if snapshots else 1
+    staging = os.path.join(directory, _snapshot_dir(snapshot_id) + '.partial')
+    shutil.rmtree(staging, ignore_errors=True)  # Left over from an interrupted export
+    os.makedirs(staging)
+    try:
+        taken_at = session.scalar(select(func.now()))
+        tables = {}
+        for name, changed_column in EXPORT_TABLES.items():
+            table = Base.metadata.tables[name]
+            stmt = select(*table.columns).order_by(*table.primary_key.columns)
+            if parent is not None:
+                stmt = stmt.where(table.c[changed_column] >= parent.taken_at - EXPORT_OVERLAP)
+            types = [_column_type(c) for c in table.columns]
+            meta = {'snapshot': snapshot_id, 'table': name}
+            with TableWriter(os.path.join(staging, f'{name}.col'), list(zip(table.columns.keys(), types)), meta) as writer:
+                if copy:
+                    _copy_to(session, stmt, writer, types, batch_size)
+                else:
+                    _fetch_to(session, stmt, writer, batch_size)
+            tables[name] = writer.rows
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    finally:
+        if snapshot_transaction:
+            session.rollback()  # Read-only: just end the snapshot transaction
+    os.replace(staging, os.path.join(directory, _snapshot_dir(snapshot_id)))
+    snapshot = Snapshot(directory, snapshot_id, parent.id if parent else None, taken_at, tables)
+    _write_manifest(directory, snapshots + [snapshot])
+    return snapshot
@@ -0,0 +1,103 @@
+import csv
+import math
+import re
+
+# Geohash: a base-32 string naming a lat/lon cell; every extra character splits the cell
+# into 32, and cells sharing a prefix are nested, so "near this cell" is a prefix range
+# scan on an ordinary B-tree index (neighbors.geohash).
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 9   # Stored length: cells of roughly 5 x 5 m
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 2 * math.pi * EARTH_RADIUS_KM / 360
+
+def encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    """Geohash of a point, `precision` characters long."""
+    if not -90 <= latitude <= 90 or not -180 <= longitude <= 180:
+        raise ValueError("Coordinates out of range")
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        span, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (span[0] + span[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            span[0] = middle
+        else:
+            span[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+def cell_size(precision):
+    """(height, width) in degrees of the cells of a given geohash length."""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+def covering_cells(latitude, longitude, radius_km):
+    """Geohash prefixes whose cells together cover every point within radius_km.
+
+    Picks the longest prefix whose cell is at least radius_km tall and wide, then
+    returns that cell and its 8 neighbours. Returns [] when no prefix is coarse enough
+    (very large radius, or near the poles): the caller then prunes by bounding box only.
+    """
+    lat_delta, lon_delta = bounding_deltas(latitude, radius_km)
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = cell_size(precision)
+        if height >= lat_delta and width >= lon_delta:
+            break
+    else:
+        return []
+    cells = set()
+    for dy in (-height, 0, height):
+        for dx in (-width, 0, width):
+            lat = latitude + dy
+            if -90 <= lat <= 90:
+                lon = (longitude + dx + 180) % 360 - 180
+                cells.add(encode(lat, lon, precision))
+    return sorted(cells)
+
+def bounding_deltas(latitude, radius_km):
+    """(degrees of latitude, degrees of longitude) spanned by radius_km at this latitude."""
+    lat_delta = radius_km / KM_PER_DEGREE
+    cos_lat = math.cos(math.radians(latitude))
+    lon_delta = 360.0 if cos_lat < 1e-9 else min(360.0, radius_km / (KM_PER_DEGREE * cos_lat))
+    return lat_delta, lon_delta
+
+def distance_km(lat1, lon1, lat2, lon2):
+    """Great-circle (haversine) distance between two points."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+# GAZETTEER: offline address -> coordinates lookup (no geocoding service needed)
+def normalise_address(address):
+    return re.sub(r'[^a-z0-9]+', ' ', address.lower()).strip()
+
+class Gazetteer:
+    """Coordinates for known addresses, from a CSV file with address,latitude,longitude columns."""
+
+    def __init__(self, places=None):
+        self.places = {}
+        for address, latitude, longitude in places or ():
+            self.add(address, latitude, longitude)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, newline='', encoding='utf-8') as f:
+            return cls((row['address'], float(row['latitude']), float(row['longitude'])) for row in csv.DictReader(f))
+
+    def add(self, address, latitude, longitude):
+        self.places[normalise_address(address)] = (latitude, longitude)
+
+    def lookup(self, address):
+        """(latitude, longitude) for an address (case and punctuation ignored), or None."""
+        return self.places.get(normalise_address(address))
+
+    def __len__(self):
+        return len(self.places)
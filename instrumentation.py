@@ -0,0 +1,206 @@
+import functools
+import inspect
+import os
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from sqlalchemy import event
+
+# Latency histogram bucket upper bounds in ms (last bucket is everything slower)
+BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000)
+SLOW_QUERY_MS = float(os.environ.get('DB_SLOW_QUERY_MS', 100))
+SLOW_LOG_SIZE = 200
+
+# Name of the instrumented database function currently running (per thread/task)
+_current_function = ContextVar('db_function', default=None)
+
+class _Stats:
+    """Counters for one database.py function (or '(unattributed)' for other SQL)."""
+
+    def __init__(self):
+        self.calls = 0
+        self.queries = 0
+        self.rows = 0
+        self.total_ms = 0.0
+        self.query_ms = 0.0
+        self.histogram = [0] * (len(BUCKETS_MS) + 1)
+
+    def observe_call(self, elapsed_ms, rows):
+        self.calls += 1
+        self.rows += rows
+        self.total_ms += elapsed_ms
+        for i, bound in enumerate(BUCKETS_MS):
+            if elapsed_ms <= bound:
+                self.histogram[i] += 1
+                break
+        else:
+            self.histogram[-1] += 1
+
+    def as_dict(self):
+        return {
+            'calls': self.calls, 'queries': self.queries, 'rows': self.rows,
+            'total_ms': round(self.total_ms, 3), 'query_ms': round(self.query_ms, 3),
+            'avg_ms': round(self.total_ms / self.calls, 3) if self.calls else 0.0,
+            'queries_per_call': round(self.queries / self.calls, 2) if self.calls else float(self.queries),
+            'histogram': dict(zip([f"<={b}ms" for b in BUCKETS_MS] + [f">{BUCKETS_MS[-1]}ms"], self.histogram)),
+        }
+
+class _State:
+    def __init__(self):
+        self.enabled = False
+        self.engines = []
+        self.slow_query_ms = SLOW_QUERY_MS
+        self.lock = threading.Lock()
+        self.functions = {}
+        self.slow_queries = deque(maxlen=SLOW_LOG_SIZE)
+
+    def stats_for(self, name):
+        stats = self.functions.get(name)
+        if stats is None:
+            stats = self.functions[name] = _Stats()
+        return stats
+
+_state = _State()
+
+def _row_count(result):
+    if isinstance(result, (list, tuple)):
+        return len(result)
+    if result is None or isinstance(result, bool):
+        return 0
+    return 1
+
+def _record_call(name, start, rows):
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    with _state.lock:
+        _state.stats_for(name).observe_call(elapsed_ms, rows)
+
+def instrumented(fn):
+    """Attribute the SQL a database function issues to it, and time each call.
+
+    While instrumentation is disabled the wrapper is a single flag check.
+    """
+    name = fn.__name__
+    if inspect.isgeneratorfunction(fn):
+        @functools.wraps(fn)
+        def generator_wrapper(*args, **kwargs):
+            if not _state.enabled:
+                yield from fn(*args, **kwargs)
+                return
+            gen, rows, start = fn(*args, **kwargs), 0, time.perf_counter()
+            try:
+                while True:
+                    # Generators run in the caller's context, so set the name around each resume only
+                    token = _current_function.set(name)
+                    try:
+                        item = next(gen)
+                    except StopIteration:
+                        break
+                    finally:
+                        _current_function.reset(token)
+                    rows += 1
+                    yield item
+            finally:
+                gen.close()
+                _record_call(name, start, rows)
+        return generator_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not _state.enabled:
+            return fn(*args, **kwargs)
+        token = _current_function.set(name)
+        start, rows = time.perf_counter(), 0
+        try:
+            result = fn(*args, **kwargs)
+            rows = _row_count(result)
+            return result
+        finally:
+            _current_function.reset(token)
+            _record_call(name, start, rows)
+    return wrapper
+
+# Engine events (only attached while enabled)
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed_ms = (time.perf_counter() - conn.info['query_start'].pop()) * 1000
+    name = _current_function.get() or '(unattributed)'
+    with _state.lock:
+        stats = _state.stats_for(name)
+        stats.queries += 1
+        stats.query_ms += elapsed_ms
+        if elapsed_ms >= _state.slow_query_ms:
+            _state.slow_queries.append({
+                'function': name, 'ms': round(elapsed_ms, 3), 'sql': statement,
+                'parameters': parameters, 'executemany': executemany,
+                'at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            })
+
+def _handle_error(exception_context):
+    # Failed statements never reach after_cursor_execute; drop their start time
+    starts = exception_context.connection.info.get('query_start') if exception_context.connection else None
+    if starts:
+        starts.pop()
+
+def enable(engine=None, slow_query_ms=None):
+    """Start collecting stats for queries on `engine` (default: the shared db_connect engine)."""
+    if engine is None:
+        from db_connect import get_engine
+        engine = get_engine()
+    _state.slow_query_ms = SLOW_QUERY_MS if slow_query_ms is None else slow_query_ms
+    if engine not in _state.engines:
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(engine, 'handle_error', _handle_error)
+        _state.engines.append(engine)
+    _state.enabled = True
+
+def disable():
+    """Detach from every engine; instrumented functions go back to a bare flag check."""
+    _state.enabled = False
+    for engine in _state.engines:
+        event.remove(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.remove(engine, 'after_cursor_execute', _after_cursor_execute)
+        event.remove(engine, 'handle_error', _handle_error)
+    _state.engines = []
+
+def is_enabled():
+    return _state.enabled
+
+def reset():
+    """Clear all counters and the slow-query log."""
+    with _state.lock:
+        _state.functions.clear()
+        _state.slow_queries.clear()
+
+def bound_sql(entry):
+    """A slow-log entry's SQL with its bound parameters appended, for copy/paste into EXPLAIN."""
+    return f"{entry['sql']}\n-- parameters: {entry['parameters']!r}"
+
+def get_stats():
+    """Snapshot of per-function counters and the slow-query log."""
+    with _state.lock:
+        return {
+            'enabled': _state.enabled,
+            'slow_query_ms': _state.slow_query_ms,
+            'functions': {name: stats.as_dict() for name, stats in sorted(_state.functions.items())},
+            'slow_queries': list(_state.slow_queries),
+        }
+
+def format_stats(stats=None, slow_limit=10):
+    """Human-readable report of get_stats() for the CLI."""
+    stats = stats or get_stats()
+    lines = [f"Instrumentation: {'on' if stats['enabled'] else 'off'} (slow query >= {stats['slow_query_ms']} ms)"]
+    if not stats['functions']:
+        lines.append("No queries recorded yet.")
+    for name, s in stats['functions'].items():
+        lines.append(f"- {name}: {s['calls']} calls, {s['queries']} queries, {s['rows']} rows, "
+                     f"avg {s['avg_ms']} ms, SQL time {s['query_ms']} ms")
+    slow = stats['slow_queries'][-slow_limit:]
+    if slow:
+        lines.append(f"Slowest recent queries (last {len(slow)}):")
+        for entry in slow:
+            lines.append(f"- {entry['ms']} ms in {entry['function']}: {bound_sql(entry)}")
+    return "\n".join(lines)
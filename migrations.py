@@ -0,0 +1,188 @@
+from sqlalchemy import MetaData, Table, Column, Integer, String, DateTime, inspect, select, update, func, table, column
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from sqlalchemy.schema import CreateColumn
+from models import Base, Loan, TOOL_SEARCH_DDL, LOAN_BOOKING_DDL, CHANGE_FEED_DDL
+
+# Kept out of Base.metadata so dropping/recreating the app tables doesn't lose history
+version_metadata = MetaData()
+schema_version = Table(
+    'schema_version', version_metadata,
+    Column('version', Integer, primary_key=True),
+    Column('description', String(200), nullable=False),
+    Column('applied_at', DateTime, nullable=False, server_default=func.now()),
+)
+
+# Helpers: every migration must be safe to re-run against a schema that already has the change
+def _create_index(conn, table_name, index_name):
+    """Create one of the indexes declared on a models.py table, if missing."""
+    table = Base.metadata.tables[table_name]
+    index = next(ix for ix in table.indexes if ix.name == index_name)
+    index.create(conn, checkfirst=True)
+
+def _add_column(conn, table_name, column_name):
+    """ALTER TABLE ... ADD COLUMN using the column as declared in models.py, if missing."""
+    if column_name in {c['name'] for c in inspect(conn).get_columns(table_name)}:
+        return
+    column = Base.metadata.tables[table_name].c[column_name]
+    conn.exec_driver_sql(f"ALTER TABLE {table_name} ADD COLUMN {CreateColumn(column).compile(dialect=conn.dialect)}")
+
+# MIGRATIONS: (version, description, upgrade(conn)), applied in order
+def _baseline(conn):
+    """Tables as originally created by Base.metadata.create_all."""
+
+def _open_loan_unique_index(conn):
+    # Definition as of this version (models.py has since narrowed it, see _reservations)
+    conn.exec_driver_sql("CREATE UNIQUE INDEX IF NOT EXISTS uq_loans_open_tool ON loans (tool_id) WHERE return_date IS NULL")
+
+def _hot_query_indexes(conn):
+    _create_index(conn, 'loans', 'ix_loans_open_due_date')
+    _create_index(conn, 'loans', 'ix_loans_borrower_id')
+    _create_index(conn, 'loans', 'ix_loans_tool_id')
+    _create_index(conn, 'tools', 'ix_tools_owner_id')
+
+def _tool_availability(conn):
+    _add_column(conn, 'tools', 'current_loan_id')
+    _create_index(conn, 'tools', 'ix_tools_available')
+    _create_index(conn, 'tools', 'ix_tools_available_owner')
+    # Bare table: the mapped Tool would also SET updated_at, which only arrives in version 11
+    tools = table('tools', column('id'), column('current_loan_id'))
+    open_loan = select(Loan.id).where(Loan.tool_id == tools.c.id, Loan.return_date.is_(None)).limit(1).scalar_subquery()
+    conn.execute(update(tools).values(current_loan_id=open_loan))
+
+def _tool_search(conn):
+    # Postgres only: SQLite searches with LIKE and needs no schema change
+    if conn.dialect.name == 'postgresql':
+        for statement in TOOL_SEARCH_DDL:
+            conn.exec_driver_sql(statement)
+
+def _digest_index(conn):
+    _create_index(conn, 'loans', 'ix_loans_open_borrower')
+
+def _reservations(conn):
+    _add_column(conn, 'loans', 'is_reservation')
+    # One open loan per tool now ignores reservations: rebuild the index with its new predicate
+    conn.exec_driver_sql("DROP INDEX IF EXISTS uq_loans_open_tool")
+    _create_index(conn, 'loans', 'uq_loans_open_tool')
+    if conn.dialect.name == 'postgresql':
+        for statement in LOAN_BOOKING_DDL:
+            conn.exec_driver_sql(statement)
+
+def _add_updated_at(conn, table):
+    if 'updated_at' not in {c['name'] for c in inspect(conn).get_columns(table)}:
+        if conn.dialect.name == 'sqlite':
+            # SQLite can't ADD COLUMN with a non-constant default: add it bare, then backfill
+            conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN updated_at DATETIME")
+            conn.exec_driver_sql(f"UPDATE {table} SET updated_at = CURRENT_TIMESTAMP")
+        else:
+            _add_column(conn, table, 'updated_at')
+    _create_index(conn, table, f'ix_{table}_updated_at')
+
+def _reporting(conn):
+    _add_updated_at(conn, 'loans')
+    for table in ('neighbor_loan_stats', 'tool_loan_stats', 'summary_refresh'):
+        Base.metadata.tables[table].create(conn, checkfirst=True)
+
+def _neighbor_locations(conn):
+    for column in ('latitude', 'longitude', 'geohash'):
+        _add_column(conn, 'neighbors', column)
+    _geohash_collation(conn)
+    _create_index(conn, 'neighbors', 'ix_neighbors_geohash')
+
+def _geohash_collation(conn):
+    # Postgres: neighbors.geohash as declared (COLLATE "C"); changing it rebuilds ix_neighbors_geohash
+    if conn.dialect.name != 'postgresql':
+        return
+    collation = conn.exec_driver_sql(
+        "SELECT collation_name FROM information_schema.columns "
+        "WHERE table_schema = current_schema() AND table_name = 'neighbors' AND column_name = 'geohash'"
+    ).scalar()
+    if collation != 'C':
+        conn.exec_driver_sql('ALTER TABLE neighbors ALTER COLUMN geohash TYPE VARCHAR(12) COLLATE "C"')
+
+def _loan_archive(conn):
+    Base.metadata.tables['loans_archive'].create(conn, checkfirst=True)
+
+def _change_tracking(conn):
+    for table in ('neighbors', 'tools'):
+        _add_updated_at(conn, table)
+
+def _change_feed(conn):
+    for table in ('change_events', 'change_cursors'):
+        Base.metadata.tables[table].create(conn, checkfirst=True)
+    if conn.dialect.name == 'postgresql':
+        for statement in CHANGE_FEED_DDL:  # Idempotent: harmless if after_create already ran them
+            conn.exec_driver_sql(statement)
+
+MIGRATIONS = [
+    (1, 'baseline schema', _baseline),
+    (2, 'one open loan per tool (partial unique index)', _open_loan_unique_index),
+    (3, 'indexes for overdue, availability and owner lookups', _hot_query_indexes),
+    (4, 'denormalised tool availability (tools.current_loan_id)', _tool_availability),
+    (5, 'tool search (tsvector + trigram indexes on Postgres)', _tool_search),
+    (6, 'open loans by borrower index for the overdue digest', _digest_index),
+    (7, 'reservations (loans.is_reservation, no overlapping bookings per tool)', _reservations),
+    (8, 'loans.updated_at and materialised lending summary tables', _reporting),
+    (9, 'neighbour coordinates and geohash index for proximity search', _neighbor_locations),
+    (10, 'loans_archive for archived loan history (range-partitioned by loan_date on Postgres)', _loan_archive),
+    (11, 'neighbors.updated_at and tools.updated_at for incremental exports', _change_tracking),
+    (12, 'change feed (change_events, change_cursors, NOTIFY trigger on Postgres)', _change_feed),
+    (13, 'byte-wise collation for neighbors.geohash on Postgres (databases migrated past 9)', _geohash_collation),
+]
+
+HEAD = MIGRATIONS[-1][0]
+SCHEMA_LOCK_ID = 7261001  # Postgres advisory lock key: one process migrates at a time
+
+# READ
+def current_version(conn):
+    """Highest applied version, or None if the database was never stamped."""
+    if not inspect(conn).has_table('schema_version'):
+        return None
+    return conn.execute(select(func.max(schema_version.c.version))).scalar()
+
+# UPGRADE
+def _stamp(conn, version, description):
+    conn.execute(schema_version.insert().values(version=version, description=description))
+
+def upgrade(engine):
+    """Bring the database up to HEAD; returns the list of versions applied."""
+    with engine.begin() as conn:
+        if conn.dialect.name == 'postgresql':
+            # Concurrent launches queue here; the loser then sees the winner's stamps
+            conn.execute(select(func.pg_advisory_xact_lock(SCHEMA_LOCK_ID)))
+        version_metadata.create_all(conn)
+        version = current_version(conn)
+        if not inspect(conn).has_table('loans'):
+            # Fresh (or dropped) database: build the current schema in one go and stamp it
+            conn.execute(schema_version.delete())
+            Base.metadata.create_all(conn)
+            _stamp(conn, HEAD, 'initial schema at head')
+            return [HEAD]
+        # Unstamped but populated: tables predate migrations, so replay every (idempotent) step
+        version = version or 0
+        applied = []
+        for number, description, migrate in MIGRATIONS:
+            if number <= version:
+                continue
+            migrate(conn)
+            _stamp(conn, number, description)
+            applied.append(number)
+        return applied
+
+def ensure_schema(engine):
+    """Startup check: a single SELECT when the database is already at HEAD, else upgrade().
+
+    Returns the versions applied. Trusts schema_version, so after dropping the app tables
+    by hand run upgrade() (python migrations.py) rather than relying on this.
+    """
+    try:
+        with engine.connect() as conn:
+            if conn.execute(select(func.max(schema_version.c.version))).scalar() == HEAD:
+                return []
+    except (OperationalError, ProgrammingError):
+        pass  # No schema_version table yet
+    return upgrade(engine)
+
+if __name__ == "__main__":
+    from db_connect import get_engine
+    applied = upgrade(get_engine())
+    print(f"Applied migrations: {applied}" if applied else f"Schema up to date (version {HEAD}).")
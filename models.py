@@ -1,5 +1,7 @@
-from sqlalchemy import Column, Integer, String, Text, Date, ForeignKey, CheckConstraint
-from sqlalchemy.orm import declarative_base, relationship  # Fixed import for 2.0+
+import json
+from sqlalchemy import Column, Integer, BigInteger, String, Text, Float, Date, DateTime, Boolean, ForeignKey, CheckConstraint, Index, DDL, event, false, func, text
+from sqlalchemy.orm import declarative_base, relationship, configure_mappers  # Fixed import for 2.0+
+from sqlalchemy.ext.hybrid import hybrid_property
 
 Base = declarative_base()
 
@@ -9,21 +11,56 @@ class Neighbor(Base):
     name = Column(String(100), nullable=False)
     address = Column(String(200), nullable=False)
     email = Column(String(100), unique=True, nullable=False)
+    # Optional location (given, or looked up in a geo.Gazetteer); geohash is derived from it
+    # by database.set_neighbor_location and indexed for proximity search
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
+    # Byte-wise "C" collation on Postgres: prefix range scans need '~' to sort after every
+    # geohash character, which locale collations (e.g. en_US.UTF-8) don't guarantee
+    geohash = Column(String(12).with_variant(String(12, collation='C'), 'postgresql'), nullable=True)
+    # Database clock, bumped by every ORM/Core UPDATE: incremental export.export_snapshot's filter
+    updated_at = Column(DateTime, nullable=False, default=func.now(), onupdate=func.now(), server_default=func.now())
     
     # Relationships with string refs (avoids NameError)
     tools = relationship('Tool', backref='owner')  # Auto: tool.owner = neighbor
     loans_as_borrower = relationship('Loan', foreign_keys='Loan.borrower_id', backref='borrower')  # Auto: loan.borrower = neighbor
 
+    # Proximity search scans geohash prefix ranges (database.get_nearby_tools)
+    __table_args__ = (
+        Index('ix_neighbors_geohash', 'geohash'),
+        Index('ix_neighbors_updated_at', 'updated_at'),
+    )
+
 class Tool(Base):
     __tablename__ = 'tools'
     id = Column(Integer, primary_key=True)
     name = Column(String(100), nullable=False)
     description = Column(Text)
     owner_id = Column(Integer, ForeignKey('neighbors.id'), nullable=False)
+    # Denormalised availability: id of the open loan holding this tool, NULL when it's free.
+    # Kept in step by the loan writes in database.py; no FK, as tools<->loans would then
+    # have two join paths (rebuild with database.rebuild_tool_availability if in doubt)
+    current_loan_id = Column(Integer, nullable=True)
+    updated_at = Column(DateTime, nullable=False, default=func.now(), onupdate=func.now(), server_default=func.now())
     
     # Relationship with string ref
     loans = relationship('Loan', backref='tool')  # Auto: loan.tool = this tool
 
+    @hybrid_property
+    def is_available(self):
+        return self.current_loan_id == None  # noqa: E711 (also builds the SQL IS NULL)
+
+    # get_neighbor_tools / Neighbor.tools look tools up by owner; the partial indexes
+    # cover "available now" listings, optionally per owner, in id (keyset) order
+    __table_args__ = (
+        Index('ix_tools_owner_id', 'owner_id'),
+        Index('ix_tools_available', 'id',
+              postgresql_where=text('current_loan_id IS NULL'), sqlite_where=text('current_loan_id IS NULL')),
+        Index('ix_tools_available_owner', 'owner_id', 'id',
+              postgresql_where=text('current_loan_id IS NULL'), sqlite_where=text('current_loan_id IS NULL')),
+        Index('ix_tools_updated_at', 'updated_at'),
+    )
+
 class Loan(Base):
     __tablename__ = 'loans'
     id = Column(Integer, primary_key=True)
@@ -33,6 +70,157 @@ class Loan(Base):
     due_date = Column(Date, nullable=False)
     return_date = Column(Date, nullable=True)
     condition_note = Column(Text)
+    # Future booking of [loan_date, due_date): not picked up yet, so it holds dates but not the tool
+    is_reservation = Column(Boolean, nullable=False, default=False, server_default=false())
+    # Database clock, bumped by every ORM/Core UPDATE: reports.refresh_summary's and
+    # export.export_snapshot's watermark
+    updated_at = Column(DateTime, nullable=False, default=func.now(), onupdate=func.now(), server_default=func.now())
     
-    # Constraint: due_date > loan_date (enforced in Postgres)
-    __table_args__ = (CheckConstraint('due_date > loan_date', name='check_due_after_loan'),)
\ No newline at end of file
+    # Constraints: due_date > loan_date (enforced in Postgres), and at most one open
+    # (unreturned) loan per tool so concurrent borrowers can't double-book a tool.
+    # Overlapping bookings (loans or reservations) are excluded by ex_loans_tool_period below.
+    __table_args__ = (
+        CheckConstraint('due_date > loan_date', name='check_due_after_loan'),
+        Index('uq_loans_open_tool', 'tool_id', unique=True,
+              postgresql_where=text('return_date IS NULL AND NOT is_reservation'),
+              sqlite_where=text('return_date IS NULL AND NOT is_reservation')),
+        # Hot paths: overdue scan over open loans only, and FK lookups from either side
+        Index('ix_loans_open_due_date', 'due_date',
+              postgresql_where=text('return_date IS NULL'), sqlite_where=text('return_date IS NULL')),
+        Index('ix_loans_borrower_id', 'borrower_id'),
+        # Overdue digest job walks open loans in (borrower_id, id) keyset order
+        Index('ix_loans_open_borrower', 'borrower_id', 'id',
+              postgresql_where=text('return_date IS NULL'), sqlite_where=text('return_date IS NULL')),
+        Index('ix_loans_tool_id', 'tool_id'),
+        Index('ix_loans_updated_at', 'updated_at'),
+    )
+
+# Cold storage for loan history: returned loans moved out of `loans` by archive.archive_loans,
+# so the hot table holds only open and recent loans. Rows keep their loan id and are never
+# updated. On Postgres the table is range-partitioned by loan_date, one partition per year
+# (created by the archive job), so an old year can be detached or dropped as a whole; a
+# partitioned table's primary key must include the partition key, hence (id, loan_date).
+# `loans` itself stays unpartitioned: uq_loans_open_tool and ex_loans_tool_period would
+# likewise have to include loan_date, which would stop them doing their job.
+class LoanArchive(Base):
+    __tablename__ = 'loans_archive'
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    loan_date = Column(Date, primary_key=True)
+    borrower_id = Column(Integer, ForeignKey('neighbors.id'), nullable=False)
+    tool_id = Column(Integer, ForeignKey('tools.id'), nullable=False)
+    due_date = Column(Date, nullable=False)
+    return_date = Column(Date, nullable=False)
+    condition_note = Column(Text)
+    archived_at = Column(DateTime, nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        Index('ix_loans_archive_borrower_id', 'borrower_id'),
+        Index('ix_loans_archive_tool_id', 'tool_id'),
+        {'postgresql_partition_by': 'RANGE (loan_date)'},
+    )
+
+# Materialised lending counters (reports.refresh_summary), one row per borrower and per tool.
+# Derived data: safe to drop, a full refresh rebuilds them from loans.
+class NeighborLoanStats(Base):
+    __tablename__ = 'neighbor_loan_stats'
+    neighbor_id = Column(Integer, ForeignKey('neighbors.id', ondelete='CASCADE'), primary_key=True)
+    loans = Column(Integer, nullable=False)
+    open_loans = Column(Integer, nullable=False)
+    returned = Column(Integer, nullable=False)
+    late = Column(Integer, nullable=False)         # Returned after the due date
+    loan_days = Column(Integer, nullable=False)    # Sum of returned loan durations
+
+class ToolLoanStats(Base):
+    __tablename__ = 'tool_loan_stats'
+    tool_id = Column(Integer, ForeignKey('tools.id', ondelete='CASCADE'), primary_key=True)
+    loans = Column(Integer, nullable=False)
+    open_loans = Column(Integer, nullable=False)
+    returned = Column(Integer, nullable=False)
+    late = Column(Integer, nullable=False)
+    loan_days = Column(Integer, nullable=False)
+
+class SummaryRefresh(Base):
+    __tablename__ = 'summary_refresh'
+    name = Column(String(50), primary_key=True)
+    watermark = Column(DateTime, nullable=False)   # Database time the last refresh started
+
+# Change feed (changes.py): one append-only row per neighbour, tool or loan write, inserted in
+# the write's own transaction, so an event exists exactly when its change was committed.
+# Consumers read in (txid, id) order. On Postgres txid is the writing transaction's id and
+# readers stop below the oldest transaction still running, so a slow commit with a lower id
+# can't be skipped; SQLite serialises writers, so txid stays 0 and id order is commit order.
+class ChangeEvent(Base):
+    __tablename__ = 'change_events'
+    id = Column(Integer, primary_key=True)
+    txid = Column(BigInteger, nullable=False, server_default=text('0'))  # Postgres: txid_current() (CHANGE_FEED_DDL)
+    entity = Column(String(20), nullable=False)     # 'neighbor', 'tool' or 'loan'
+    entity_id = Column(Integer, nullable=False)
+    action = Column(String(20), nullable=False)     # 'created', 'started', 'returned', 'updated', 'deleted' or 'archived'
+    data = Column(Text)                             # JSON: the row's values (database.CHANGE_FIELDS)
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+
+    @property
+    def values(self):
+        """`data` decoded (dates as ISO strings)."""
+        return json.loads(self.data) if self.data else {}
+
+    __table_args__ = (
+        Index('ix_change_events_position', 'txid', 'id'),
+        {'sqlite_autoincrement': True},  # Never reuse an id, even after pruning the newest events
+    )
+
+class ChangeCursor(Base):
+    __tablename__ = 'change_cursors'
+    name = Column(String(100), primary_key=True)   # One per consumer
+    txid = Column(BigInteger, nullable=False)      # Position of the last event consumed
+    event_id = Column(Integer, nullable=False)
+    updated_at = Column(DateTime, nullable=False, default=func.now(), onupdate=func.now(), server_default=func.now())
+
+# Tool search (database.search_tools). On Postgres: a generated tsvector over name (weight A)
+# and description (weight B) with a GIN index, plus a trigram index on name for typo-tolerant
+# matches. Not mapped on Tool so SQLite (LIKE fallback) keeps the same table definition.
+# Every statement is idempotent so migrations can replay them.
+SEARCH_CONFIG = 'english'
+TOOL_SEARCH_DDL = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "ALTER TABLE tools ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(name, '')), 'A') || "
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(description, '')), 'B')) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_tools_search_vector ON tools USING gin (search_vector)",
+    "CREATE INDEX IF NOT EXISTS ix_tools_name_trgm ON tools USING gin (name gin_trgm_ops)",
+)
+for statement in TOOL_SEARCH_DDL:
+    event.listen(Tool.__table__, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+
+# Booking conflicts (database.create_reservation / create_loan). On Postgres a GiST exclusion
+# constraint rejects any two unreturned rows for one tool whose [loan_date, due_date) ranges
+# overlap, so the check is one index probe and holds under concurrency. Other backends rely
+# on the NOT EXISTS probe in the booking INSERT itself.
+LOAN_BOOKING_DDL = (
+    "CREATE EXTENSION IF NOT EXISTS btree_gist",
+    "DO $$ BEGIN "
+    "IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'ex_loans_tool_period') THEN "
+    "ALTER TABLE loans ADD CONSTRAINT ex_loans_tool_period EXCLUDE USING gist "
+    "(tool_id WITH =, daterange(loan_date, due_date) WITH &&) WHERE (return_date IS NULL); "
+    "END IF; END $$",
+)
+for statement in LOAN_BOOKING_DDL:
+    event.listen(Loan.__table__, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+
+# Change feed on Postgres: events carry their transaction id, and every INSERT statement
+# wakes LISTEN change_events consumers once its transaction commits (changes.ChangeListener)
+CHANGE_CHANNEL = 'change_events'
+CHANGE_FEED_DDL = (
+    "ALTER TABLE change_events ALTER COLUMN txid SET DEFAULT txid_current()",
+    "CREATE OR REPLACE FUNCTION notify_change_events() RETURNS trigger LANGUAGE plpgsql AS "
+    f"$$ BEGIN PERFORM pg_notify('{CHANGE_CHANNEL}', ''); RETURN NULL; END $$",
+    "DROP TRIGGER IF EXISTS change_events_notify ON change_events",
+    "CREATE TRIGGER change_events_notify AFTER INSERT ON change_events "
+    "FOR EACH STATEMENT EXECUTE FUNCTION notify_change_events()",
+)
+for statement in CHANGE_FEED_DDL:
+    event.listen(ChangeEvent.__table__, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+
+# Create the backref attributes (Tool.owner, Loan.borrower, Loan.tool) now rather than at
+# the first query, so loader options can name them before anything has been queried
+configure_mappers()
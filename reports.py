@@ -0,0 +1,194 @@
+from datetime import date, timedelta
+from sqlalchemy import select, insert, delete, func, case, cast, and_, union, union_all, Float, Integer
+from models import Neighbor, Tool, Loan, LoanArchive, NeighborLoanStats, ToolLoanStats, SummaryRefresh
+from instrumentation import instrumented
+from db_connect import replica_read
+
+# Lending analytics: every report is one GROUP BY (plus window functions) in the database.
+# Reservations that were never picked up are not loans and are left out throughout;
+# archived loans (archive.archive_loans) still count.
+SUMMARY_NAME = 'lending'
+REFRESH_OVERLAP = timedelta(minutes=5)  # Re-read changes this far behind the watermark (late commits)
+UTILISATION_DAYS = 30
+
+# Dialect helpers: date arithmetic and n-ary min/max differ between Postgres and SQLite
+def _days(dialect, later, earlier):
+    """Whole days from `earlier` to `later`."""
+    if dialect == 'postgresql':
+        return later - earlier  # date - date is an integer
+    return cast(func.julianday(later) - func.julianday(earlier), Integer)
+
+def _greatest(dialect, *args):
+    return func.greatest(*args) if dialect == 'postgresql' else func.max(*args)
+
+def _least(dialect, *args):
+    return func.least(*args) if dialect == 'postgresql' else func.min(*args)
+
+def _ratio(numerator, denominator):
+    return cast(numerator, Float) / func.nullif(denominator, 0)
+
+def _dialect(session):
+    return session.get_bind().dialect.name
+
+def _across_history(columns, key_name=None, where=None):
+    """Aggregate loans (reservations excluded) and loans_archive separately, then add up.
+
+    columns(table) gives the labelled COUNT/SUM columns for one table and where(table) any
+    extra filters; key_name groups both sides by that column (as `key`). Summing per-table
+    partials keeps SQLite from streaming every row through a UNION ALL subquery.
+    """
+    branches = []
+    for table in (Loan.__table__, LoanArchive.__table__):
+        conditions = list(where(table)) if where else []
+        if table is Loan.__table__:
+            conditions.append(table.c.is_reservation.is_(False))
+        if key_name:
+            key = table.c[key_name]
+            branches.append(select(key.label('key'), *columns(table)).where(*conditions).group_by(key))
+        else:
+            branches.append(select(*columns(table)).where(*conditions))
+    parts = union_all(*branches).subquery()
+    # Postgres sums integers into NUMERIC: cast back so counters stay ints
+    sums = [cast(func.sum(column), Integer).label(column.name) for column in parts.c if column.name != 'key']
+    return select(parts.c.key, *sums).group_by(parts.c.key) if key_name else select(*sums)
+
+def _counter_columns(dialect, loans):
+    returned = loans.c.return_date.is_not(None)
+    return [
+        func.count().label('loans'),
+        func.sum(case((returned, 0), else_=1)).label('open_loans'),
+        func.sum(case((returned, 1), else_=0)).label('returned'),
+        func.sum(case((and_(returned, loans.c.return_date > loans.c.due_date), 1), else_=0)).label('late'),
+        func.sum(case((returned, _days(dialect, loans.c.return_date, loans.c.loan_date)), else_=0)).label('loan_days'),
+    ]
+
+def _counters(dialect, key_name, keys=None):
+    """Per-key loan counters (the columns of NeighborLoanStats/ToolLoanStats).
+
+    key_name is 'borrower_id' or 'tool_id'; keys optionally limits it to some of them.
+    """
+    where = (lambda loans: [loans.c[key_name].in_(keys)]) if keys is not None else None
+    return _across_history(lambda loans: _counter_columns(dialect, loans), key_name, where)
+
+def _stats_source(session, summary_key, key_name, from_summary):
+    """Counters subquery keyed by `key`: live from loan history, or read from the summary table."""
+    if from_summary:
+        model = summary_key.class_
+        return select(summary_key.label('key'), model.loans, model.open_loans, model.returned,
+                      model.late, model.loan_days).subquery()
+    return _counters(_dialect(session), key_name).subquery()
+
+def _ranked(entity_columns, join_key, counters, limit):
+    loans = func.coalesce(counters.c.loans, 0)
+    stmt = select(
+        *entity_columns,
+        loans.label('loans'),
+        func.coalesce(counters.c.open_loans, 0).label('open_loans'),
+        func.coalesce(counters.c.returned, 0).label('returned'),
+        func.coalesce(counters.c.late, 0).label('late'),
+        _ratio(counters.c.loan_days, counters.c.returned).label('avg_loan_days'),
+        _ratio(counters.c.late, counters.c.returned).label('late_ratio'),
+        _ratio(loans, func.sum(loans).over()).label('share'),
+        func.rank().over(order_by=loans.desc()).label('rank'),
+    ).outerjoin(counters, counters.c.key == join_key).order_by(loans.desc(), join_key)
+    return stmt.limit(limit) if limit else stmt
+
+# READ
+@instrumented
+@replica_read
+def neighbor_loan_stats(session, from_summary=False, limit=None):
+    """Per neighbour as borrower: loans, open, returned, late, avg_loan_days, late_ratio, share, rank.
+
+    from_summary=True reads the materialised neighbor_loan_stats table (see refresh_summary).
+    """
+    counters = _stats_source(session, NeighborLoanStats.neighbor_id, 'borrower_id', from_summary)
+    return session.execute(_ranked([Neighbor.id, Neighbor.name], Neighbor.id, counters, limit)).all()
+
+@instrumented
+@replica_read
+def tool_loan_stats(session, from_summary=False, limit=None):
+    """Per tool: loans, open, returned, late, avg_loan_days, late_ratio, share, rank."""
+    counters = _stats_source(session, ToolLoanStats.tool_id, 'tool_id', from_summary)
+    return session.execute(_ranked([Tool.id, Tool.name], Tool.id, counters, limit)).all()
+
+@instrumented
+@replica_read
+def tool_utilisation(session, start=None, end=None, limit=None):
+    """Share of days in [start, end) each tool spent on loan, busiest first (default: last 30 days)."""
+    today = date.today()
+    end = end or today + timedelta(days=1)
+    start = start or end - timedelta(days=UTILISATION_DAYS)
+    if end <= start:
+        raise ValueError("End date must be after start date")
+    dialect = _dialect(session)
+    # An open loan counts up to and including today
+    loan_end = lambda loans: func.coalesce(loans.c.return_date, today + timedelta(days=1))
+    busy = _across_history(
+        lambda loans: [func.sum(_days(dialect, _least(dialect, loan_end(loans), end),
+                                      _greatest(dialect, loans.c.loan_date, start))).label('days_on_loan')],
+        'tool_id', lambda loans: [loans.c.loan_date < end, loan_end(loans) > start],
+    ).subquery()
+    days = func.coalesce(busy.c.days_on_loan, 0)
+    utilisation = _ratio(days, (end - start).days)
+    stmt = select(
+        Tool.id, Tool.name, days.label('days_on_loan'), utilisation.label('utilisation'),
+        func.rank().over(order_by=days.desc()).label('rank'),
+    ).outerjoin(busy, busy.c.key == Tool.id).order_by(days.desc(), Tool.id)
+    return session.execute(stmt.limit(limit) if limit else stmt).all()
+
+@instrumented
+@replica_read
+def lending_overview(session):
+    """One row of library-wide totals: loans, open, overdue, returned, late, avg_loan_days, late_ratio, borrowers."""
+    dialect = _dialect(session)
+    def columns(loans):
+        overdue = and_(loans.c.return_date.is_(None), loans.c.due_date < date.today())
+        return _counter_columns(dialect, loans) + [func.sum(case((overdue, 1), else_=0)).label('overdue')]
+    totals = _across_history(columns).subquery()
+    borrowers = union(select(Loan.borrower_id).where(Loan.is_reservation.is_(False)),
+                      select(LoanArchive.borrower_id)).subquery()
+    return session.execute(select(
+        func.coalesce(totals.c.loans, 0).label('loans'),
+        func.coalesce(totals.c.open_loans, 0).label('open_loans'),
+        func.coalesce(totals.c.overdue, 0).label('overdue'),
+        func.coalesce(totals.c.returned, 0).label('returned'),
+        func.coalesce(totals.c.late, 0).label('late'),
+        _ratio(totals.c.loan_days, totals.c.returned).label('avg_loan_days'),
+        _ratio(totals.c.late, totals.c.returned).label('late_ratio'),
+        select(func.count()).select_from(borrowers).scalar_subquery().label('borrowers'),
+    )).one()
+
+# REFRESH
+def _refresh_table(session, model, key_column, key_name, changed):
+    counters = _counters(_dialect(session), key_name, changed)
+    clear = delete(model)
+    if changed is not None:
+        clear = clear.where(key_column.in_(changed))
+    session.execute(clear)
+    columns = [key_column.key, 'loans', 'open_loans', 'returned', 'late', 'loan_days']
+    return session.execute(insert(model).from_select(columns, counters)).rowcount
+
+@instrumented
+def refresh_summary(session, full=False):
+    """Bring neighbor_loan_stats/tool_loan_stats up to date; returns {'full', 'neighbors', 'tools'}.
+
+    Incremental runs recompute only the borrowers and tools of loans whose updated_at is
+    past the last watermark (less REFRESH_OVERLAP). Deleting a loan leaves no such trace,
+    so run with full=True after deletions (the first run is always full).
+    """
+    now = session.scalar(select(func.now()))
+    state = session.get(SummaryRefresh, SUMMARY_NAME)
+    full = full or state is None
+    changed_borrowers = changed_tools = None
+    if not full:
+        since = state.watermark - REFRESH_OVERLAP
+        changed_borrowers = select(Loan.borrower_id).where(Loan.updated_at > since)
+        changed_tools = select(Loan.tool_id).where(Loan.updated_at > since)
+    neighbors = _refresh_table(session, NeighborLoanStats, NeighborLoanStats.neighbor_id, 'borrower_id', changed_borrowers)
+    tools = _refresh_table(session, ToolLoanStats, ToolLoanStats.tool_id, 'tool_id', changed_tools)
+    if state is None:
+        session.add(SummaryRefresh(name=SUMMARY_NAME, watermark=now))
+    else:
+        state.watermark = now
+    session.commit()
+    return {'full': full, 'neighbors': neighbors, 'tools': tools}
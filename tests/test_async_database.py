@@ -0,0 +1,156 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import pytest
+from sqlalchemy import insert
+from sqlalchemy.exc import InvalidRequestError, IntegrityError
+from sqlalchemy.ext.asyncio import async_sessionmaker
+import async_database as adb
+from database import _is_open_loan_conflict, _is_booking_conflict
+from models import Base, Loan
+from datetime import date, timedelta
+
+# Runs offline against aiosqlite; point TEST_ASYNC_DB_URL at postgresql+asyncpg://... for Postgres
+TEST_ASYNC_DB_URL = os.environ.get('TEST_ASYNC_DB_URL')
+
+@pytest.fixture(scope="function")
+def make_session(tmp_path):
+    engine = adb.make_async_engine(TEST_ASYNC_DB_URL or f"sqlite+aiosqlite:///{tmp_path / 'async.db'}")
+
+    async def setup():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+        await adb.create_tables(engine)
+    asyncio.run(setup())
+    yield async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+    async def teardown():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+        await engine.dispose()
+    asyncio.run(teardown())
+
+def test_async_crud_round_trip(make_session):
+    async def scenario():
+        async with make_session() as session:
+            alice = await adb.create_neighbor(session, 'Alice', '123 Oak St', 'alice_async@test.com')
+            drill = await adb.create_tool(session, 'Drill', '18V', alice.id)
+            loan = await adb.create_loan(session, alice.id, drill.id, date.today() - timedelta(days=10), date.today() - timedelta(days=3))
+
+            overdues = await adb.get_overdue_loans(session, loader='selectin')
+            assert [l.id for l in overdues] == [loan.id]
+            assert overdues[0].borrower.name == 'Alice'
+            assert [t.name for t in await adb.get_neighbor_tools(session, alice.id)] == ['Drill']
+            loans = await adb.get_all_loans(session)
+            assert loans[0].tool_name == 'Drill'
+
+            returned = await adb.update_loan_return(session, loan.id, date.today(), 'Good')
+            assert returned.condition_note == 'Good'
+            assert await adb.delete_loan(session, loan.id) is True
+            assert await adb.delete_loan(session, loan.id) is False
+    asyncio.run(scenario())
+
+def test_async_error_semantics_match_sync(make_session):
+    async def scenario():
+        async with make_session() as session:
+            alice = await adb.create_neighbor(session, 'Alice', '123 Oak St', 'alice_async_err@test.com')
+            alice_id = alice.id  # Failed writes roll back and expire loaded instances
+            with pytest.raises(ValueError, match="Email already exists"):
+                await adb.create_neighbor(session, 'Alice2', '456 Pine', 'alice_async_err@test.com')
+            with pytest.raises(ValueError, match="Invalid email format"):
+                await adb.create_neighbor(session, 'Bob', '456 Pine', 'bob')
+            with pytest.raises(ValueError, match="Invalid owner ID"):
+                await adb.create_tool(session, 'Saw', None, 999)
+            drill = await adb.create_tool(session, 'Drill', '18V', alice_id)
+            drill_id = drill.id
+            with pytest.raises(ValueError, match="Due date must be after loan date"):
+                await adb.create_loan(session, alice_id, drill_id, date.today(), date.today())
+            await adb.create_loan(session, alice_id, drill_id, date.today(), date.today() + timedelta(days=7))
+            with pytest.raises(ValueError, match="Tool is currently loaned out"):
+                await adb.create_loan(session, alice_id, drill_id, date.today(), date.today() + timedelta(days=7))
+            neighbor = await adb.get_neighbor(session, alice_id)
+            with pytest.raises(InvalidRequestError):
+                neighbor.tools  # Default 'raise' loader: no hidden lazy IO under asyncio
+    asyncio.run(scenario())
+
+def test_async_return_and_delete_roll_back_on_failure(make_session, monkeypatch):
+    async def scenario():
+        async with make_session() as session:
+            alice = await adb.create_neighbor(session, 'Alice', '123 Oak St', 'alice_async_rb@test.com')
+            drill = await adb.create_tool(session, 'Drill', '18V', alice.id)
+            loan = await adb.create_loan(session, alice.id, drill.id, date.today(), date.today() + timedelta(days=7))
+            loan_id = loan.id
+
+            async def boom(*args, **kwargs):
+                raise RuntimeError("change log unavailable")
+            with monkeypatch.context() as m:
+                m.setattr(adb, '_record_changes', boom)
+                with pytest.raises(RuntimeError):
+                    await adb.update_loan_return(session, loan_id, date.today(), 'Good')
+                with pytest.raises(RuntimeError):
+                    await adb.delete_loan(session, loan_id)
+
+            # Session is usable again and nothing from the failed writes stuck
+            loan = await session.get(Loan, loan_id)
+            assert loan.return_date is None
+            assert await adb.delete_loan(session, loan_id) is True
+    asyncio.run(scenario())
+
+def test_concurrent_async_bookings(make_session):
+    async def scenario():
+        async with make_session() as session:
+            alice = await adb.create_neighbor(session, 'Alice', '123 Oak St', 'alice_async_race@test.com')
+            drill = await adb.create_tool(session, 'Drill', '18V', alice.id)
+
+        async def book():
+            async with make_session() as session:
+                try:
+                    await adb.create_loan(session, alice.id, drill.id, date.today(), date.today() + timedelta(days=7))
+                    return 'booked'
+                except ValueError as e:
+                    return str(e)
+        return await asyncio.gather(*(book() for _ in range(5)))
+    results = asyncio.run(scenario())
+    assert results.count('booked') == 1
+
+postgres_only = pytest.mark.skipif(not (TEST_ASYNC_DB_URL or '').startswith('postgresql'),
+                                   reason="Set TEST_ASYNC_DB_URL to postgresql+asyncpg://... (constraint names come from asyncpg)")
+
+def _asyncpg_style_error(constraint_name):
+    # SQLAlchemy's asyncpg adapter raises its own error `from` the driver's, which names the constraint
+    cause = Exception("duplicate key value violates constraint")
+    cause.constraint_name = constraint_name
+    orig = Exception(str(cause))
+    orig.__cause__ = cause
+    return IntegrityError('INSERT INTO loans ...', {}, orig)
+
+def test_conflicts_are_classified_without_psycopg2_diag():
+    assert _is_booking_conflict(_asyncpg_style_error('ex_loans_tool_period'))
+    assert not _is_open_loan_conflict(_asyncpg_style_error('ex_loans_tool_period'))
+    assert _is_open_loan_conflict(_asyncpg_style_error('uq_loans_open_tool'))
+
+@postgres_only
+def test_asyncpg_conflicts_are_classified(make_session):
+    today = date.today()
+    async def scenario():
+        async with make_session() as session:
+            alice_id = (await adb.create_neighbor(session, 'Alice', '123 Oak St', 'alice_asyncpg@test.com')).id
+            drill_id = (await adb.create_tool(session, 'Drill', '18V', alice_id)).id
+            saw_id = (await adb.create_tool(session, 'Saw', None, alice_id)).id
+            await adb.create_loan(session, alice_id, drill_id, today, today + timedelta(days=7))
+            with pytest.raises(ValueError, match="Tool is currently loaned out"):  # uq_loans_open_tool
+                await adb.create_loan(session, alice_id, drill_id, today, today + timedelta(days=7))
+
+        # A reservation not yet committed is invisible to the loan's NOT EXISTS probe, so
+        # only ex_loans_tool_period can turn the loan away once the reservation commits
+        async with make_session() as booking, make_session() as borrowing:
+            await booking.execute(insert(Loan).values(borrower_id=alice_id, tool_id=saw_id, loan_date=today,
+                                                      due_date=today + timedelta(days=3), is_reservation=True))
+            loan = asyncio.create_task(adb.create_loan(borrowing, alice_id, saw_id, today, today + timedelta(days=7)))
+            await asyncio.sleep(0.5)  # The loan's INSERT now waits on the reservation's row
+            await booking.commit()
+            with pytest.raises(ValueError, match="Tool is reserved for those dates"):
+                await loan
+    asyncio.run(scenario())
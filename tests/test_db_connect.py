@@ -0,0 +1,42 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+import db_connect
+from db_connect import engine_kwargs, pool_settings, get_engine, dispose_engine, connect_and_query
+from models import Base, Tool
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+
+@pytest.fixture
+def sqlite_engine(tmp_path, monkeypatch):
+    dispose_engine()
+    monkeypatch.setattr(db_connect, 'DB_URL', f"sqlite:///{tmp_path / 'pool.db'}")
+    yield get_engine()
+    dispose_engine()
+
+def test_pool_settings_from_environment(monkeypatch):
+    monkeypatch.setenv('DB_POOL_SIZE', '20')
+    monkeypatch.setenv('DB_MAX_OVERFLOW', '0')
+    monkeypatch.setenv('DB_POOL_PRE_PING', 'false')
+    monkeypatch.setenv('DB_STATEMENT_TIMEOUT_MS', '1500')
+    settings = pool_settings()
+    assert settings == {'pool_size': 20, 'max_overflow': 0, 'pre_ping': False, 'statement_timeout_ms': 1500}
+    kwargs = engine_kwargs('postgresql://u:p@localhost/db', **settings)
+    assert kwargs['pool_size'] == 20 and kwargs['max_overflow'] == 0 and kwargs['pool_pre_ping'] is False
+    assert kwargs['connect_args'] == {'options': '-c statement_timeout=1500'}
+    assert 'pool_size' not in engine_kwargs('sqlite://', **settings)  # In-memory SQLite: single connection
+
+def test_engine_is_built_once_and_shared(sqlite_engine):
+    assert get_engine() is sqlite_engine
+    Base.metadata.create_all(sqlite_engine)
+    assert connect_and_query("SELECT count(*) FROM neighbors") == [(0,)]
+    assert sqlite_engine.pool.checkedout() == 0  # Raw connection went back to the pool
+
+def test_sqlite_backend_enforces_foreign_keys(sqlite_engine):
+    Base.metadata.create_all(sqlite_engine)
+    with sessionmaker(bind=sqlite_engine)() as session:
+        session.add(Tool(name='Orphan', owner_id=999))
+        with pytest.raises(IntegrityError):
+            session.commit()
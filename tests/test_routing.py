@@ -0,0 +1,91 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+import db_connect
+from db_connect import ReplicaSet, make_engine, dispose_engine
+from database import (get_session, create_neighbor, get_neighbor, get_all_neighbors, get_neighbors_page,
+                      iter_neighbors)
+from reports import neighbor_loan_stats
+from models import Base, Neighbor
+from sqlalchemy.orm import sessionmaker
+
+# Routing needs separate databases to tell apart, so these tests use their own SQLite files:
+# the primary and each replica hold one neighbour named after the database.
+@pytest.fixture
+def databases(tmp_path, monkeypatch):
+    def url(name):
+        path = tmp_path / f'{name}.db'
+        if not path.exists():
+            engine = make_engine(f"sqlite:///{path}")
+            Base.metadata.create_all(engine)
+            with sessionmaker(bind=engine)() as session:
+                session.add(Neighbor(name=name, address='Somewhere', email=f'{name}@test.com'))
+                session.commit()
+            engine.dispose()
+        return f"sqlite:///{path}"
+
+    def configure(*replicas):
+        dispose_engine()
+        monkeypatch.setattr(db_connect, 'DB_URL', url('primary'))
+        monkeypatch.setattr(db_connect, 'REPLICA_URLS', list(replicas))
+
+    yield url, configure
+    dispose_engine()
+
+def names(rows):
+    return [row.name for row in rows]
+
+def test_reads_go_to_the_replica_and_writes_to_the_primary(databases):
+    url, configure = databases
+    configure(url('replica'))
+    with get_session() as session:
+        assert names(get_all_neighbors(session)) == ['replica']
+        assert names(get_neighbors_page(session)) == ['replica']
+        assert names(iter_neighbors(session)) == ['replica']
+        assert names(neighbor_loan_stats(session)) == ['replica']
+        assert get_neighbor(session, 1).name == 'primary'  # Not marked @replica_read
+        create_neighbor(session, 'Alice', 'Test St', 'alice@test.com')
+        # Read-your-writes: after a write this session reads from the primary
+        assert names(get_all_neighbors(session)) == ['primary', 'Alice']
+    with get_session() as session:
+        assert names(get_all_neighbors(session)) == ['replica']
+
+def test_without_read_your_writes_reads_stay_on_the_replica(databases):
+    url, configure = databases
+    configure(url('replica'))
+    with get_session(read_your_writes=False) as session:
+        create_neighbor(session, 'Alice', 'Test St', 'alice@test.com')
+        assert names(get_all_neighbors(session)) == ['replica']
+
+def test_replicas_take_turns_per_transaction(databases):
+    url, configure = databases
+    configure(url('first'), url('second'))
+    with get_session() as session:
+        assert names(get_all_neighbors(session)) == ['first']
+        assert names(get_all_neighbors(session)) == ['first']  # Same transaction, same replica
+        session.commit()
+        assert names(get_all_neighbors(session)) == ['second']
+    with get_session() as session:
+        assert names(get_all_neighbors(session)) == ['first']
+
+def test_unhealthy_replicas_are_skipped(databases, tmp_path):
+    url, configure = databases
+    broken = f"sqlite:///{tmp_path / 'missing' / 'replica.db'}"  # Directory doesn't exist: can't connect
+    configure(broken, url('replica'))
+    for _ in range(2):
+        with get_session() as session:
+            assert names(get_all_neighbors(session)) == ['replica']
+    configure(broken)
+    with get_session() as session:
+        assert names(get_all_neighbors(session)) == ['primary']  # No healthy replica: fall back
+
+def test_health_is_rechecked_after_the_interval(tmp_path):
+    engine = make_engine(f"sqlite:///{tmp_path / 'missing' / 'replica.db'}")
+    replicas, cached = ReplicaSet([engine], check_interval=0), ReplicaSet([engine], check_interval=3600)
+    assert replicas.choose() is None and cached.choose() is None
+    (tmp_path / 'missing').mkdir()
+    assert replicas.choose() is engine
+    assert cached.choose() is None  # Still within the interval of the failed check
+    engine.dispose()